@@ -1,11 +1,19 @@
-from flask import Flask, request
-from db import get_db, create_tables
+from flask import Flask, Response, request, jsonify
+from db import get_db, create_tables, atualizar_agregados, indexar_dividas, desindexar_dividas
+from busca_dividas import buscar_dividas, escolher_divida
+from extrator import converter_valor
 import os
-import requests
+import atexit
 from datetime import date, datetime, timedelta
 
-# Importa a nova função de interpretação
-from gemini_utils import interpretar_mensagem_gemini
+# Interpretação em camadas: classificador local e, se necessário, o Gemini
+from interpretador import interpretar_mensagens, obter_estatisticas
+from fila import FilaMensagens
+from dedup import Deduplicador
+from relatorios import gerar_relatorio, formatar_relatorio, definir_orcamento
+from gemini_utils import cache_interpretacao
+from whatsapp_client import ClienteWhatsApp
+from metricas import contador, histograma, medidor, cronometrado, exportar, perfilar
 
 app = Flask(__name__)
 # Garante que as tabelas sejam criadas na inicialização
@@ -16,16 +24,19 @@ ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN")
 
+# --- Métricas (expostas em /metrics) ---
+
+ETAPAS_SEGUNDOS = histograma("financeiro_etapa_segundos", "Duração das etapas do webhook e do processamento")
+DB_SEGUNDOS = histograma("financeiro_db_segundos", "Duração das funções de banco do app")
+INTENCOES = contador("financeiro_intencoes_total", "Mensagens interpretadas, por intenção")
+ERROS = contador("financeiro_erros_total", "Erros por etapa")
+
 # --- Funções do Banco de Dados ---
 
-def registrar_transacao(user_id, transacao):
-    conn = get_db()
-    c = conn.cursor()
-    c.execute(
-        '''
-        INSERT INTO transacoes (user_id, tipo, categoria, valor, data, descricao, data_vencimento, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''',
+@cronometrado(DB_SEGUNDOS, funcao="registrar_transacoes")
+def registrar_transacoes(user_id, transacoes):
+    """Grava várias transações do usuário (e seus agregados) em uma única transação do SQLite."""
+    linhas = [
         (
             user_id,
             transacao.get("tipo"),
@@ -36,52 +47,75 @@ def registrar_transacao(user_id, transacao):
             transacao.get("data_vencimento"),
             transacao.get("status")
         )
-    )
-    conn.commit()
-    conn.close()
+        for transacao in transacoes
+    ]
+    conn = get_db(user_id)
+    # `with conn` faz commit ao final ou rollback em caso de erro, deixando a conexão reutilizável limpa
+    with conn:
+        pendentes = []
+        for linha in linhas:
+            c = conn.execute(
+                '''
+                INSERT INTO transacoes (user_id, tipo, categoria, valor, data, descricao, data_vencimento, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                linha
+            )
+            if linha[7] == 'pendente':
+                pendentes.append((c.lastrowid, user_id, linha[5]))
+        indexar_dividas(conn, pendentes)
+        atualizar_agregados(conn, user_id, [(tipo, valor, data, status) for _, tipo, _, valor, data, _, _, status in linhas])
+
+def registrar_transacao(user_id, transacao):
+    registrar_transacoes(user_id, [transacao])
 
+@cronometrado(DB_SEGUNDOS, funcao="marcar_divida_paga")
 def marcar_divida_paga(user_id, descricao_divida):
-    conn = get_db()
-    c = conn.cursor()
-    # Procura a dívida pendente mais recente com a descrição fornecida
-    c.execute(
-        """
-        UPDATE transacoes 
-        SET status = 'pago', data = ?
-        WHERE user_id = ? AND status = 'pendente' AND descricao LIKE ?
-        ORDER BY data_vencimento ASC LIMIT 1
-        """,
-        (str(date.today()), user_id, f'%{descricao_divida}%')
-    )
-    rows_affected = c.rowcount
-    conn.commit()
-    conn.close()
-    return rows_affected > 0
+    """
+    Dá baixa na dívida pendente mais parecida com a descrição (sem acento, com sinônimos).
+    Retorna (descricao_paga, empatadas): a descrição da dívida paga, ou None e a lista de
+    dívidas igualmente parecidas para o usuário escolher.
+    """
+    conn = get_db(user_id)
+    hoje = str(date.today())
+    with conn:
+        # Lock de escrita antes da busca: com vários workers do gunicorn, duas mensagens
+        # "paguei a luz" do mesmo usuário não escolhem e pagam a mesma dívida duas vezes
+        conn.execute("BEGIN IMMEDIATE")
+        divida, empatadas = escolher_divida(buscar_dividas(conn, user_id, descricao_divida), descricao_divida)
+        if divida is None:
+            return None, empatadas
+        id_divida, descricao, valor, _, _, tipo = divida
+        c = conn.execute(
+            "UPDATE transacoes SET status = 'pago', data = ? WHERE id = ? AND status = 'pendente'", (hoje, id_divida)
+        )
+        if c.rowcount != 1:
+            return None, []
+        desindexar_dividas(conn, [id_divida])
+        atualizar_agregados(conn, user_id, [(tipo, valor, hoje, 'pago')])
+    return descricao, []
 
+@cronometrado(DB_SEGUNDOS, funcao="consultar_dividas_pendentes")
 def consultar_dividas_pendentes(user_id):
-    conn = get_db()
+    conn = get_db(user_id)
     c = conn.cursor()
     c.execute(
         "SELECT descricao, valor, data_vencimento FROM transacoes WHERE user_id = ? AND status = 'pendente' ORDER BY data_vencimento ASC",
         (user_id,)
     )
     dividas = c.fetchall()
-    conn.close()
     return dividas
 
+@cronometrado(DB_SEGUNDOS, funcao="resumo_usuario")
 def resumo_usuario(user_id):
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT COALESCE(SUM(valor),0) FROM transacoes WHERE user_id=? AND tipo='receita' AND status='pago'", (user_id,))
-    total_receita = c.fetchone()[0]
-    c.execute("SELECT COALESCE(SUM(valor),0) FROM transacoes WHERE user_id=? AND tipo='despesa' AND status='pago'", (user_id,))
-    total_despesa = c.fetchone()[0]
-    saldo = total_receita - total_despesa
-    conn.close()
-    return saldo
+    # Totais mantidos por registrar_transacoes/marcar_divida_paga: uma busca pela chave primária
+    conn = get_db(user_id)
+    row = conn.execute("SELECT total_receitas - total_despesas FROM saldos WHERE user_id = ?", (user_id,)).fetchone()
+    return row[0] if row else 0
 
+@cronometrado(DB_SEGUNDOS, funcao="verificar_vencimentos_proximos")
 def verificar_vencimentos_proximos(user_id, dias=7):
-    conn = get_db()
+    conn = get_db(user_id)
     c = conn.cursor()
     data_limite = date.today() + timedelta(days=dias)
     c.execute(
@@ -89,24 +123,216 @@ def verificar_vencimentos_proximos(user_id, dias=7):
         (user_id, data_limite.strftime('%Y-%m-%d'))
     )
     vencimentos = c.fetchall()
-    conn.close()
     return vencimentos
 
 # --- Comunicação com WhatsApp ---
 
+# Sessão HTTP compartilhada, novas tentativas e limite de taxa ficam no cliente (whatsapp_client.py)
+cliente_whatsapp = ClienteWhatsApp(
+    ACCESS_TOKEN,
+    PHONE_NUMBER_ID,
+    mensagens_por_segundo=float(os.getenv("WHATSAPP_MSGS_POR_SEGUNDO", "80")),
+    num_workers=int(os.getenv("WHATSAPP_WORKERS", "8")),
+)
+# Registrado antes da fila de mensagens: no encerramento, roda depois dela e envia as últimas respostas
+atexit.register(cliente_whatsapp.encerrar)
+
 def send_whatsapp_message(phone_number, message_text):
-    url = f"https://graph.facebook.com/v19.0/{PHONE_NUMBER_ID}/messages"
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Content-Type": "application/json"}
-    data = {"messaging_product": "whatsapp", "to": phone_number, "text": {"body": message_text}}
+    if not cliente_whatsapp.enfileirar(phone_number, message_text):
+        print(f"Fila de envio cheia, mensagem para {phone_number} descartada.")
+
+# --- Processamento das Mensagens ---
+
+INTENCOES_REGISTRO = ["registrar_gasto", "registrar_receita", "registrar_divida"]
+RESPOSTA_ERRO = "😕 Ocorreu um erro. Já estou verificando o que aconteceu."
+RESPOSTA_NAO_INTERPRETADA = "Não consegui processar sua mensagem. Pode tentar de outra forma?"
+
+def valor_numerico(valor):
+    """Valor em float; o Gemini às vezes o devolve como texto ("30", "R$ 1.234,56"). None se não for um valor."""
     try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        print(f"Mensagem enviada para {phone_number}: {message_text}")
+        if isinstance(valor, str):
+            return converter_valor(valor.lower().replace("r$", "").strip())
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+def preparar_registro(dados):
+    """Define o tipo da transação com base na intenção e retorna a resposta de confirmação."""
+    intencao = dados.get("intencao")
+    dados["tipo"] = "despesa" if intencao == "registrar_gasto" else "receita" if intencao == "registrar_receita" else "divida"
+    valor = valor_numerico(dados.get("valor"))
+    if valor is None:
+        raise ValueError(f"Valor inválido: {dados.get('valor')!r}")
+    dados["valor"] = valor
+    return f"✅ {dados['tipo'].capitalize()} registrada: {dados.get('descricao')} - R${dados['valor']:.2f}"
+
+def gerar_resposta(user_id, dados):
+    """Executa a ação correspondente à intenção interpretada e retorna o texto da resposta."""
+    resp = ""
+    intencao = dados.get("intencao")
+
+    if intencao in INTENCOES_REGISTRO:
+        resp = preparar_registro(dados)
+        registrar_transacao(user_id, dados)
+
+    elif intencao == "marcar_pago":
+        descricao = dados.get("descricao")
+        paga, empatadas = marcar_divida_paga(user_id, descricao) if descricao else (None, [])
+        if paga:
+            resp = f"✅ Baixa de pagamento realizada para: {paga}."
+        elif empatadas:
+            resp = f"Encontrei mais de uma dívida parecida com '{descricao}':\n"
+            for _, desc, val, venc, *_ in empatadas:
+                resp += f"\n• {desc} - R${val:.2f} (vence em {datetime.strptime(venc, '%Y-%m-%d').strftime('%d/%m')})"
+            resp += "\n\nQual delas você pagou? Responda com 'paguei' e a descrição completa."
+        else:
+            resp = f"Não encontrei uma dívida pendente com a descrição '{descricao}'. Tente ser mais específico."
+
+    elif intencao == "consultar_dividas":
+        dividas = consultar_dividas_pendentes(user_id)
+        if not dividas:
+            resp = "Você não tem nenhuma dívida pendente. Ufa! 😅"
+        else:
+            resp = "Suas dívidas pendentes:\n"
+            for desc, val, venc in dividas:
+                resp += f"\n• {desc} - R${val:.2f} (vence em {datetime.strptime(venc, '%Y-%m-%d').strftime('%d/%m')})"
+
+    elif intencao == "verificar_vencimentos":
+        vencimentos = verificar_vencimentos_proximos(user_id)
+        if not vencimentos:
+            resp = "Nenhuma conta vencendo nos próximos 7 dias. 👍"
+        else:
+            resp = "Atenção! Contas vencendo em breve:\n"
+            for desc, val, venc in vencimentos:
+                 resp += f"\n• {desc} - R${val:.2f} (vence em {datetime.strptime(venc, '%Y-%m-%d').strftime('%d/%m')})"
+
+    elif intencao == "consultar_saldo":
+        saldo = resumo_usuario(user_id)
+        resp = f"💰 Seu saldo atual (receitas - despesas pagas) é de R${saldo:.2f}"
+
+    elif intencao == "consultar_orcamento":
+        # 'data' (se informada) indica o mês do relatório
+        mes = (dados.get("data") or "")[:7] or None
+        resp = formatar_relatorio(gerar_relatorio(user_id, mes))
+
+    elif intencao == "definir_orcamento":
+        categoria, valor = dados.get("categoria"), valor_numerico(dados.get("valor"))
+        if categoria and valor:
+            definir_orcamento(user_id, categoria, valor)
+            resp = f"✅ Orçamento definido: {categoria} - R${valor:.2f} por mês."
+        else:
+            resp = "Para definir um orçamento, diga o valor e a categoria. Ex: 'orçamento de 500 para alimentação'."
+
+    elif intencao == "saudacao":
+        resp = "Olá! 👋 Sou seu assistente financeiro. Como posso ajudar?"
+
+    else: # ajuda ou desconhecido
+        resp = (
+            "Comandos que eu entendo:\n\n"
+            "• *Registrar*: 'gastei 50 no açaí', 'salário de 2000', 'conta de luz 150 vence dia 25'\n"
+            "• *Pagar*: 'paguei a conta de luz'\n"
+            "• *Consultar*: 'saldo', 'minhas dívidas', 'verificar contas'\n"
+            "• *Orçamento*: 'orçamento de 500 para alimentação', 'resumo do mês'"
+        )
+
+    return resp
+
+def processar_mensagens(user_id, mensagens):
+    """
+    Interpreta as mensagens do usuário (em lote), executa as ações e responde.
+    Registros consecutivos são gravados juntos, antes de qualquer consulta que dependa deles.
+    Roda nos workers da fila.
+    """
+    try:
+        with perfilar("processar_mensagens"), ETAPAS_SEGUNDOS.cronometrar(etapa="processamento"):
+            _processar_mensagens(user_id, mensagens)
     except Exception as e:
-        print("Erro ao enviar mensagem:", e)
+        ERROS.inc(etapa="processamento")
+        print(f"Erro ao processar mensagens de {user_id}: {e}")
+        send_whatsapp_message(user_id, RESPOSTA_ERRO)
+
+def _processar_mensagens(user_id, mensagens):
+    # Cada mensagem tem sua resposta; um erro em uma delas não descarta as demais
+    respostas, registros = [], []  # registros: (índice da resposta, dados)
+
+    def gravar_registros():
+        try:
+            registrar_transacoes(user_id, [dados for _, dados in registros])
+        except Exception as e:
+            # A gravação é atômica: nenhum dos registros do grupo foi salvo
+            ERROS.inc(etapa="gravacao")
+            print(f"Erro ao gravar transações de {user_id}: {e}")
+            for indice, _ in registros:
+                respostas[indice] = RESPOSTA_ERRO
+        registros.clear()
+
+    with ETAPAS_SEGUNDOS.cronometrar(etapa="interpretacao"):
+        interpretacoes = interpretar_mensagens(mensagens)
+    for mensagem, dados in zip(mensagens, interpretacoes):
+        INTENCOES.inc(intencao=(dados or {}).get("intencao") or "nao_interpretada")
+        try:
+            if not dados:
+                ERROS.inc(etapa="interpretacao")
+                respostas.append(RESPOSTA_NAO_INTERPRETADA)
+            elif dados.get("intencao") in INTENCOES_REGISTRO:
+                respostas.append(preparar_registro(dados))
+                registros.append((len(respostas) - 1, dados))
+            else:
+                if registros:
+                    gravar_registros()
+                respostas.append(gerar_resposta(user_id, dados))
+        except Exception as e:
+            ERROS.inc(etapa="mensagem")
+            print(f"Erro ao processar a mensagem '{mensagem}' de {user_id}: {e}")
+            respostas.append(RESPOSTA_ERRO)
+    if registros:
+        gravar_registros()
+
+    for resp in respostas:
+        send_whatsapp_message(user_id, resp)
+
+# Pool de workers: o webhook só valida e enfileira, o restante acontece em segundo plano
+fila_mensagens = FilaMensagens(
+    processar_mensagens,
+    num_workers=int(os.getenv("WORKERS_MENSAGENS", "4")),
+    capacidade=int(os.getenv("CAPACIDADE_FILA", "1000")),
+)
+# Drena a fila antes de o processo terminar (ex.: SIGTERM do gunicorn)
+atexit.register(fila_mensagens.encerrar)
+medidor("financeiro_fila_mensagens_pendentes", "Lotes aguardando um worker", fila_mensagens.tamanho)
+medidor("financeiro_fila_envio_pendentes", "Respostas aguardando envio ao WhatsApp", cliente_whatsapp.fila.tamanho)
+
+# Descarta reentregas da Meta antes de qualquer chamada ao LLM, ao banco ou ao WhatsApp
+deduplicador = Deduplicador(
+    max_itens=int(os.getenv("DEDUP_MAX_ITENS", "50000")),
+    ttl=int(os.getenv("DEDUP_TTL", "3600")),
+)
 
 # --- Rota Principal (Webhook) ---
 
+def extrair_mensagens(data):
+    """
+    Percorre todas as entries/changes/messages do payload e agrupa as mensagens por usuário
+    como pares (id, texto), na ordem em que chegaram. Mensagens que não são de texto, ou sem
+    remetente, id ou corpo, são ignoradas individualmente.
+    """
+    mensagens_por_usuario = {}
+    for entry in data.get('entry', []):
+        for change in entry.get('changes', []):
+            for message_data in change.get('value', {}).get('messages', []):
+                if 'text' not in message_data:
+                    print(f"Mensagem do tipo '{message_data.get('type')}' ignorada.")
+                    continue
+                remetente, message_id = message_data.get('from'), message_data.get('id')
+                texto = (message_data.get('text') or {}).get('body')
+                if not remetente or not message_id or not isinstance(texto, str):
+                    # Só a mensagem malformada é descartada; as demais do mesmo POST seguem
+                    ERROS.inc(etapa="mensagem_malformada")
+                    print(f"Mensagem malformada ignorada: {message_data}")
+                    continue
+                mensagens_por_usuario.setdefault(remetente, []).append((message_id, texto.strip()))
+    return mensagens_por_usuario
+
 @app.route("/webhook", methods=["GET", "POST"])
 def webhook():
     if request.method == 'GET':
@@ -116,77 +342,52 @@ def webhook():
         return "Verificação falhou", 403
 
     if request.method == "POST":
-        user_id = ""
-        try:
-            data = request.get_json()
-            value = data['entry'][0]['changes'][0]['value']
-            if 'messages' not in value: return 'EVENT_RECEIVED', 200
+        with ETAPAS_SEGUNDOS.cronometrar(etapa="webhook"):
+            return _receber_webhook()
 
-            message_data = value['messages'][0]
-            user_id = message_data['from']
-            message_text = message_data['text']['body'].strip()
+def _receber_webhook():
+    try:
+        with ETAPAS_SEGUNDOS.cronometrar(etapa="parse_payload"):
+            mensagens_por_usuario = extrair_mensagens(request.get_json())
+    except (KeyError, TypeError, AttributeError) as e:
+        ERROS.inc(etapa="payload")
+        print(f"Payload ignorado: {e}")
+        return 'EVENT_RECEIVED', 200
 
-            dados = interpretar_mensagem_gemini(message_text)
-            if not dados:
-                send_whatsapp_message(user_id, "Não consegui processar sua mensagem. Pode tentar de outra forma?")
-                return 'EVENT_RECEIVED', 200
-
-            resp = ""
-            intencao = dados.get("intencao")
-
-            if intencao in ["registrar_gasto", "registrar_receita", "registrar_divida"]:
-                # Define o tipo com base na intenção
-                dados["tipo"] = "despesa" if intencao == "registrar_gasto" else "receita" if intencao == "registrar_receita" else "divida"
-                registrar_transacao(user_id, dados)
-                resp = f"✅ {dados['tipo'].capitalize()} registrada: {dados.get('descricao')} - R${dados.get('valor'):.2f}"
-            
-            elif intencao == "marcar_pago":
-                descricao = dados.get("descricao")
-                if descricao and marcar_divida_paga(user_id, descricao):
-                    resp = f"✅ Baixa de pagamento realizada para: {descricao}."
-                else:
-                    resp = f"Não encontrei uma dívida pendente com a descrição '{descricao}'. Tente ser mais específico."
-
-            elif intencao == "consultar_dividas":
-                dividas = consultar_dividas_pendentes(user_id)
-                if not dividas:
-                    resp = "Você não tem nenhuma dívida pendente. Ufa! 😅"
-                else:
-                    resp = "Suas dívidas pendentes:\n"
-                    for desc, val, venc in dividas:
-                        resp += f"\n• {desc} - R${val:.2f} (vence em {datetime.strptime(venc, '%Y-%m-%d').strftime('%d/%m')})"
-
-            elif intencao == "verificar_vencimentos":
-                vencimentos = verificar_vencimentos_proximos(user_id)
-                if not vencimentos:
-                    resp = "Nenhuma conta vencendo nos próximos 7 dias. 👍"
-                else:
-                    resp = "Atenção! Contas vencendo em breve:\n"
-                    for desc, val, venc in vencimentos:
-                         resp += f"\n• {desc} - R${val:.2f} (vence em {datetime.strptime(venc, '%Y-%m-%d').strftime('%d/%m')})"
-
-            elif intencao == "consultar_saldo":
-                saldo = resumo_usuario(user_id)
-                resp = f"💰 Seu saldo atual (receitas - despesas pagas) é de R${saldo:.2f}"
-
-            elif intencao == "saudacao":
-                resp = "Olá! 👋 Sou seu assistente financeiro. Como posso ajudar?"
-
-            else: # ajuda ou desconhecido
-                resp = (
-                    "Comandos que eu entendo:\n\n"
-                    "• *Registrar*: 'gastei 50 no açaí', 'salário de 2000', 'conta de luz 150 vence dia 25'\n"
-                    "• *Pagar*: 'paguei a conta de luz'\n"
-                    "• *Consultar*: 'saldo', 'minhas dívidas', 'verificar contas'"
-                )
-
-            send_whatsapp_message(user_id, resp)
+    novas_por_usuario = {}
+    with ETAPAS_SEGUNDOS.cronometrar(etapa="deduplicacao"):
+        for user_id, mensagens in mensagens_por_usuario.items():
+            novas = [(message_id, texto) for message_id, texto in mensagens if deduplicador.registrar(message_id)]
+            if novas:
+                novas_por_usuario[user_id] = novas
 
-        except Exception as e:
-            print(f"Erro geral no webhook: {e}")
-            if user_id: send_whatsapp_message(user_id, "😕 Ocorreu um erro. Já estou verificando o que aconteceu.")
-        
-        return 'EVENT_RECEIVED', 200
+    usuarios = list(novas_por_usuario)
+    for i, user_id in enumerate(usuarios):
+        if not fila_mensagens.enfileirar(user_id, [texto for _, texto in novas_por_usuario[user_id]]):
+            # Fila cheia: libera os ids ainda não enfileirados e responde 503 para que a Meta reenvie
+            ERROS.inc(etapa="fila_cheia")
+            for pendente in usuarios[i:]:
+                for message_id, _ in novas_por_usuario[pendente]:
+                    deduplicador.esquecer(message_id)
+            return 'BUSY', 503
+
+    return 'EVENT_RECEIVED', 200
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    # Quantas mensagens foram resolvidas localmente vs. enviadas ao Gemini, e quantas reentregas foram descartadas
+    return jsonify({
+        "interpretacao": obter_estatisticas(),
+        "deduplicacao": deduplicador.obter_estatisticas(),
+        "cache_gemini": cache_interpretacao.obter_estatisticas(),
+        "fila_pendente": fila_mensagens.tamanho(),
+        "envios_whatsapp": cliente_whatsapp.obter_estatisticas(),
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Formato texto do Prometheus; valores do processo que atendeu a requisição
+    return Response(exportar(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     # Corrigido de "0.0.0.Seu" para "0.0.0.0"
@@ -0,0 +1,90 @@
+"""
+Benchmark da baixa de dívidas: busca antiga (descricao LIKE '%...%', sem índice) contra a
+busca aproximada pelo índice FTS5 (busca_dividas.buscar_dividas), em função do total de
+dívidas pendentes no banco.
+
+Uso: python benchmarks/bench_busca_dividas.py [--tamanhos 100000 1000000] [--usuarios 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+from busca_dividas import buscar_dividas, escolher_divida  # noqa: E402
+
+DESCRICOES = ["conta de luz", "Conta de Água", "internet", "aluguel", "fatura do cartão", "condomínio",
+              "energia elétrica", "gás", "parcela do carro", "escola das crianças", "plano de saúde", "IPVA"]
+BUSCAS = ["luz", "agua", "energia", "cartao", "condominio", "parcela carro", "escola"]
+
+def popular(linhas, usuarios):
+    rnd = random.Random(42)
+    hoje = date.today()
+
+    def gerar():
+        for _ in range(linhas):
+            venc = hoje + timedelta(days=rnd.randrange(60))
+            yield (f"55{rnd.randrange(usuarios):09d}", "divida", "Contas", 100.0, str(hoje),
+                   rnd.choice(DESCRICOES), str(venc), "pendente")
+
+    conn = db.get_db()
+    inicio = time.perf_counter()
+    with conn:
+        conn.executemany(
+            "INSERT INTO transacoes (user_id, tipo, categoria, valor, data, descricao, data_vencimento, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            gerar()
+        )
+    db.reindexar_dividas([conn])
+    print(f"{linhas} dívidas inseridas e indexadas no FTS5 em {time.perf_counter() - inicio:.1f}s")
+
+def medir(funcao, amostra):
+    tempos = []
+    for user_id, busca in amostra:
+        inicio = time.perf_counter()
+        funcao(user_id, busca)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), sorted(tempos)[int(len(tempos) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--usuarios", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    for tamanho in args.tamanhos:
+        with tempfile.TemporaryDirectory() as pasta:
+            db.DATABASE = os.path.join(pasta, "bench.db")
+            db.create_tables()
+            popular(tamanho, args.usuarios)
+            conn = db.get_db()
+            rnd = random.Random(7)
+            usuarios = [u for (u,) in conn.execute("SELECT DISTINCT user_id FROM transacoes LIMIT 5000")]
+            amostra = [(rnd.choice(usuarios), rnd.choice(BUSCAS)) for _ in range(args.repeticoes)]
+
+            def like(user_id, busca):
+                return conn.execute(
+                    "SELECT id FROM transacoes WHERE user_id = ? AND status = 'pendente' AND descricao LIKE ? "
+                    "ORDER BY data_vencimento ASC LIMIT 1",
+                    (user_id, f"%{busca}%")
+                ).fetchone()
+
+            def fts(user_id, busca):
+                return escolher_divida(buscar_dividas(conn, user_id, busca), busca)
+
+            acertos_like = sum(1 for u, b in amostra if like(u, b))
+            acertos_fts = sum(1 for u, b in amostra if fts(u, b)[0] or fts(u, b)[1])
+            med_like, p95_like = medir(like, amostra[:50])
+            med_fts, p95_fts = medir(fts, amostra)
+            print(f"\n== {tamanho} dívidas pendentes, {args.usuarios} usuários ==")
+            print(f"LIKE '%...%':  mediana {med_like:.3f} ms | p95 {p95_like:.3f} ms | encontrou {acertos_like}/{len(amostra)}")
+            print(f"FTS5 trigramas: mediana {med_fts:.3f} ms | p95 {p95_fts:.3f} ms | encontrou {acertos_fts}/{len(amostra)}")
+            db.fechar_conexoes()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Avalia o extrator de regras (extrator.extrair_transacao) no corpus rotulado
+benchmarks/corpus_extrator.jsonl: precisão, recall e latência por mensagem.
+
+Com GOOGLE_API_KEY definida (e --gemini), avalia também interpretar_mensagem_gemini
+nas mesmas mensagens para comparação. Como o Gemini usa a data real de hoje, as datas
+de vencimento são ignoradas na comparação com ele.
+
+Uso: python benchmarks/bench_extrator.py [--gemini]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from extrator import extrair_transacao, normalizar  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_extrator.jsonl")
+# Data de referência usada para rotular as datas relativas do corpus
+REFERENCIA = date(2026, 10, 18)
+
+def carregar_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+def correto(previsto, esperado, comparar_datas=True):
+    if previsto is None or esperado is None:
+        return False
+    if previsto.get("intencao") != esperado["intencao"]:
+        return False
+    if "valor" in esperado:
+        try:
+            if abs(float(previsto.get("valor")) - esperado["valor"]) > 0.005:
+                return False
+        except (TypeError, ValueError):
+            return False
+    if normalizar(previsto.get("descricao") or "") != normalizar(esperado["descricao"]):
+        return False
+    if comparar_datas and any(campo in esperado and previsto.get(campo) != esperado[campo] for campo in ("data", "data_vencimento")):
+        return False
+    return True
+
+def avaliar(nome, interpretar, corpus, comparar_datas=True, repeticoes=1):
+    respondidas = acertos = 0
+    positivos = sum(1 for item in corpus if item["esperado"])
+    erros = []
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        previsoes = [interpretar(item["texto"]) for item in corpus]
+    latencia_ms = (time.perf_counter() - inicio) / (repeticoes * len(corpus)) * 1000
+
+    for item, previsto in zip(corpus, previsoes):
+        if previsto is None:
+            if item["esperado"]:
+                erros.append(("não extraiu", item["texto"], item["esperado"], None))
+            continue
+        respondidas += 1
+        if correto(previsto, item["esperado"], comparar_datas):
+            acertos += 1
+        else:
+            erros.append(("errou", item["texto"], item["esperado"], previsto))
+
+    precisao = acertos / respondidas if respondidas else 0.0
+    recall = acertos / positivos if positivos else 0.0
+    print(f"\n== {nome} ==")
+    print(f"mensagens: {len(corpus)} ({positivos} extraíveis) | respondidas: {respondidas} | corretas: {acertos}")
+    print(f"precisão: {precisao:.1%} | recall: {recall:.1%} | latência: {latencia_ms:.3f} ms/mensagem")
+    for tipo, texto, esperado, previsto in erros:
+        print(f"  [{tipo}] {texto!r}: esperado {esperado}, obtido {previsto}")
+    return precisao, recall, latencia_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gemini", action="store_true", help="compara também com o Gemini (requer GOOGLE_API_KEY)")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    corpus = carregar_corpus()
+    _, _, lat_regras = avaliar(
+        "extrator de regras", lambda texto: extrair_transacao(texto, REFERENCIA), corpus, repeticoes=args.repeticoes
+    )
+
+    if args.gemini:
+        if not os.getenv("GOOGLE_API_KEY"):
+            print("\nGOOGLE_API_KEY não definida; comparação com o Gemini ignorada.")
+            return
+        from gemini_utils import interpretar_mensagem_gemini
+        _, _, lat_gemini = avaliar("Gemini", interpretar_mensagem_gemini, corpus, comparar_datas=False)
+        print(f"\nO extrator é {lat_gemini / lat_regras:,.0f}x mais rápido por mensagem.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark das consultas por usuário antes e depois dos índices compostos (migração 2).
+
+Gera uma tabela sintética de transações, mostra o plano de execução (EXPLAIN QUERY PLAN)
+e o tempo médio de cada consulta usada pelo app.py, sem e com os índices.
+
+Uso: python benchmarks/bench_indices.py [--linhas 1000000] [--usuarios 10000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+
+HOJE = date.today()
+LIMITE = (HOJE + timedelta(days=7)).strftime('%Y-%m-%d')
+
+# Consultas por usuário de app.py (os somatórios de saldo são os usados antes da tabela `saldos`)
+CONSULTAS = {
+    "consultar_dividas_pendentes": (
+        "SELECT descricao, valor, data_vencimento FROM transacoes WHERE user_id = ? AND status = 'pendente' ORDER BY data_vencimento ASC",
+        lambda u: (u,),
+    ),
+    "verificar_vencimentos_proximos": (
+        "SELECT descricao, valor, data_vencimento FROM transacoes WHERE user_id = ? AND status = 'pendente' AND data_vencimento <= ?",
+        lambda u: (u, LIMITE),
+    ),
+    "soma de receitas": (
+        "SELECT COALESCE(SUM(valor),0) FROM transacoes WHERE user_id=? AND tipo='receita' AND status='pago'",
+        lambda u: (u,),
+    ),
+    "soma de despesas": (
+        "SELECT COALESCE(SUM(valor),0) FROM transacoes WHERE user_id=? AND tipo='despesa' AND status='pago'",
+        lambda u: (u,),
+    ),
+}
+
+def gerar_linhas(linhas, usuarios):
+    rnd = random.Random(42)
+    for _ in range(linhas):
+        user_id = f"55{rnd.randrange(usuarios):09d}"
+        tipo = rnd.choice(("receita", "despesa", "despesa", "divida"))
+        data = (HOJE - timedelta(days=rnd.randrange(730))).strftime('%Y-%m-%d')
+        if tipo == "divida":
+            venc = (HOJE + timedelta(days=rnd.randrange(-30, 60))).strftime('%Y-%m-%d')
+            status = rnd.choice(("pendente", "pago"))
+        else:
+            venc, status = None, "pago"
+        yield (user_id, tipo, "Geral", round(rnd.uniform(1, 500), 2), data, f"item {rnd.randrange(1000)}", venc, status)
+
+def popular(linhas, usuarios):
+    conn = db.get_db()
+    inicio = time.perf_counter()
+    with conn:
+        conn.executemany(
+            "INSERT INTO transacoes (user_id, tipo, categoria, valor, data, descricao, data_vencimento, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            gerar_linhas(linhas, usuarios)
+        )
+    print(f"{linhas} linhas inseridas em {time.perf_counter() - inicio:.1f}s")
+
+def medir(titulo, usuarios, repeticoes):
+    conn = db.get_db()
+    rnd = random.Random(7)
+    amostra = [f"55{rnd.randrange(usuarios):09d}" for _ in range(repeticoes)]
+    print(f"\n== {titulo} ==")
+    resultados = {}
+    for nome, (sql, params) in CONSULTAS.items():
+        plano = conn.execute("EXPLAIN QUERY PLAN " + sql, params(amostra[0])).fetchall()
+        inicio = time.perf_counter()
+        for user_id in amostra:
+            conn.execute(sql, params(user_id)).fetchall()
+        media_ms = (time.perf_counter() - inicio) / len(amostra) * 1000
+        resultados[nome] = media_ms
+        print(f"{nome}: {media_ms:.3f} ms/consulta")
+        for linha in plano:
+            print(f"    {linha[-1]}")
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DATABASE = os.path.join(pasta, "bench.db")
+        db.create_tables(ate_versao=1)
+        popular(args.linhas, args.usuarios)
+        antes = medir("sem índices (migração 1)", args.usuarios, args.repeticoes)
+
+        inicio = time.perf_counter()
+        db.create_tables()
+        print(f"\nMigrações restantes aplicadas em {time.perf_counter() - inicio:.1f}s")
+        depois = medir(f"com índices (migração {db.MIGRACOES[-1][0]})", args.usuarios, args.repeticoes)
+
+        print("\n== Ganho ==")
+        for nome in CONSULTAS:
+            print(f"{nome}: {antes[nome] / depois[nome]:.0f}x mais rápido")
+        db.fechar_conexoes()
+
+if __name__ == "__main__":
+    main()
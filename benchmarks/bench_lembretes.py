@@ -0,0 +1,104 @@
+"""
+Benchmark da varredura de lembretes de vencimento (lembretes.varrer) com muitos usuários.
+
+Popula um banco temporário com N usuários, cada um com dívidas pendentes (parte vencendo
+nos próximos dias) e histórico pago, e mede a varredura completa com um envio simulado
+(latência configurável). Em seguida repete a varredura para conferir que ninguém é
+notificado duas vezes. Com --http, envia de verdade para benchmarks/fake_graph.py.
+
+Uso: python benchmarks/bench_lembretes.py [--usuarios 100000] [--latencia-ms 0] [--http]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+import lembretes  # noqa: E402
+
+def popular(usuarios):
+    rnd = random.Random(42)
+    hoje = date.today()
+
+    def gerar():
+        for u in range(usuarios):
+            user_id = f"55{u:09d}"
+            for _ in range(rnd.randint(1, 3)):
+                venc = hoje + timedelta(days=rnd.randrange(-10, 30))
+                yield (user_id, "divida", "Contas", round(rnd.uniform(10, 900), 2), str(hoje), "conta", str(venc), "pendente")
+            for _ in range(5):
+                yield (user_id, "despesa", "Geral", 10.0, str(hoje), "item", None, "pago")
+
+    conn = db.get_db()
+    with conn:
+        conn.executemany(
+            "INSERT INTO transacoes (user_id, tipo, categoria, valor, data, descricao, data_vencimento, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            gerar()
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=100_000)
+    parser.add_argument("--dias", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--latencia-ms", type=float, default=0, help="latência simulada por envio")
+    parser.add_argument("--http", action="store_true", help="envia via ClienteWhatsApp para o fake_graph local")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DATABASE = os.path.join(pasta, "bench.db")
+        db.create_tables()
+        inicio = time.perf_counter()
+        popular(args.usuarios)
+        print(f"{args.usuarios} usuários populados em {time.perf_counter() - inicio:.1f}s")
+
+        plano = db.get_db().execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM transacoes WHERE status = 'pendente' AND data_vencimento BETWEEN ? AND ?",
+            ("2000-01-01", "2000-01-02")
+        ).fetchall()
+        print("plano da varredura:", "; ".join(linha[-1] for linha in plano))
+
+        fake = None
+        if args.http:
+            from fake_graph import FakeGraph
+            from whatsapp_client import ClienteWhatsApp
+            fake = FakeGraph(latencia_ms=args.latencia_ms).iniciar()
+            cliente = ClienteWhatsApp("token", "123", base_url=fake.url, mensagens_por_segundo=1_000_000,
+                                      num_workers=args.workers)
+            sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+            enviar = cliente.enviar
+        else:
+            def enviar(user_id, texto):
+                if args.latencia_ms:
+                    time.sleep(args.latencia_ms / 1000)
+                return True
+
+        inicio = time.perf_counter()
+        linhas = sum(1 for _ in lembretes.buscar_vencimentos(args.dias))
+        tempo_consulta = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        notificados, falhas = lembretes.varrer(enviar, dias=args.dias, workers=args.workers)
+        tempo_varredura = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        repetidos, _ = lembretes.varrer(enviar, dias=args.dias, workers=args.workers)
+        tempo_repeticao = time.perf_counter() - inicio
+
+        if fake:
+            sys.stdout = stdout
+            cliente.encerrar()
+            fake.parar()
+
+        print(f"consulta única: {linhas} dívidas em {tempo_consulta * 1000:.0f} ms")
+        print(f"varredura: {notificados} usuários notificados, {falhas} falhas em {tempo_varredura:.2f}s "
+              f"({notificados / tempo_varredura:,.0f} usuários/s)")
+        print(f"segunda varredura (simula reinício): {repetidos} notificados em {tempo_repeticao * 1000:.0f} ms")
+        db.fechar_conexoes()
+
+if __name__ == "__main__":
+    main()
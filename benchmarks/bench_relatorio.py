@@ -0,0 +1,76 @@
+"""
+Benchmark de latência do relatório mensal (relatorios.gerar_relatorio) em função do
+número de transações do usuário.
+
+Para cada tamanho, popula um banco temporário com o histórico de um usuário espalhado
+por 24 meses (mais ruído de outros usuários) e mede a mediana e o p95 do relatório.
+
+Uso: python benchmarks/bench_relatorio.py [--tamanhos 1000 10000 50000 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+import relatorios  # noqa: E402
+
+CATEGORIAS = ["Alimentação", "Transporte", "Moradia", "Lazer", "Saúde", "Educação", "Contas", None]
+USUARIO = "5511999990000"
+
+def popular(linhas):
+    rnd = random.Random(42)
+    hoje = date.today()
+
+    def gerar():
+        for i in range(linhas):
+            # Metade das linhas é de outros usuários, para o índice ter trabalho a fazer
+            user_id = USUARIO if i % 2 == 0 else f"55{rnd.randrange(1000):09d}"
+            tipo = rnd.choice(("receita", "despesa", "despesa", "despesa"))
+            data = (hoje - timedelta(days=rnd.randrange(730))).strftime('%Y-%m-%d')
+            yield (user_id, tipo, rnd.choice(CATEGORIAS), round(rnd.uniform(1, 500), 2), data, "item", None, "pago")
+
+    conn = db.get_db()
+    with conn:
+        conn.executemany(
+            "INSERT INTO transacoes (user_id, tipo, categoria, valor, data, descricao, data_vencimento, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            gerar()
+        )
+    for categoria in CATEGORIAS[:4]:
+        relatorios.definir_orcamento(USUARIO, categoria, 1500)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+    parser.add_argument("--repeticoes", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'transações do usuário':>22} | {'linhas lidas':>13} | {'mediana (ms)':>12} | {'p95 (ms)':>8}")
+    for tamanho in args.tamanhos:
+        with tempfile.TemporaryDirectory() as pasta:
+            db.DATABASE = os.path.join(pasta, "bench.db")
+            db.create_tables()
+            popular(tamanho * 2)
+
+            relatorio = relatorios.gerar_relatorio(USUARIO)  # aquecimento
+            tempos = []
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                relatorios.gerar_relatorio(USUARIO)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            tempos.sort()
+            no_mes = db.get_db().execute(
+                "SELECT COUNT(*) FROM transacoes WHERE user_id = ? AND data >= ?",
+                (USUARIO, f"{relatorios._mes_anterior(relatorio['mes'])}-01")
+            ).fetchone()[0]
+            p95 = tempos[int(len(tempos) * 0.95) - 1]
+            print(f"{tamanho:>22} | {no_mes:>13} | {statistics.median(tempos):>12.2f} | {p95:>8.2f}")
+            db.fechar_conexoes()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark de escrita concorrente por número de shards (db.DATABASE_SHARDS).
+
+N processos (como os workers do gunicorn) gravam transações de usuários sorteados, cada uma
+na sua própria transação do SQLite com os agregados, como app.registrar_transacoes. Com um
+arquivo só, todos disputam o mesmo lock de escrita; com shards, só quem cai no mesmo arquivo.
+
+O ganho aparece quando o commit espera o disco (fsync) com o lock na mão. Em máquinas com
+poucos núcleos ou disco em memória o commit é só CPU e os shards não mudam a vazão;
+--latencia-commit-ms simula o tempo de sincronização do disco dentro da transação.
+
+Uso: python benchmarks/bench_shards.py [--shards 1 2 4 8] [--processos 8] [--escritas 2000]
+                                       [--synchronous NORMAL] [--latencia-commit-ms 2]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db  # noqa: E402
+
+
+def escrever(args):
+    semente, escritas, usuarios, synchronous, latencia_commit = args
+    rnd = random.Random(semente)
+    hoje = str(date.today())
+    esperas = []
+    for _ in range(escritas):
+        user_id = f"55{rnd.randrange(usuarios):09d}"
+        conn = db.get_db(user_id)
+        if synchronous:
+            conn.execute(f"PRAGMA synchronous = {synchronous}")
+        valor = float(rnd.randrange(1, 500))
+        inicio = time.perf_counter()
+        with conn:
+            conn.execute(
+                f"INSERT INTO transacoes ({db.COLUNAS_TRANSACAO}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, "despesa", "Alimentação", valor, hoje, "mercado", None, "pago")
+            )
+            db.atualizar_agregados(conn, user_id, [("despesa", valor, hoje, "pago")])
+            if latencia_commit:
+                time.sleep(latencia_commit)  # com o lock de escrita do arquivo já adquirido
+        esperas.append(time.perf_counter() - inicio)
+    db.fechar_conexoes()
+    return esperas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--processos", type=int, default=8)
+    parser.add_argument("--escritas", type=int, default=2000, help="escritas por processo")
+    parser.add_argument("--usuarios", type=int, default=100_000)
+    parser.add_argument("--synchronous", choices=["OFF", "NORMAL", "FULL"], default=None,
+                        help="sobrescreve o PRAGMA synchronous de db.PRAGMAS (FULL: fsync a cada commit)")
+    parser.add_argument("--latencia-commit-ms", type=float, default=0, help="espera simulada do disco por commit")
+    args = parser.parse_args()
+
+    print(f"{args.processos} processos x {args.escritas} escritas, CPUs: {os.cpu_count()}, "
+          f"synchronous: {args.synchronous or 'padrão de db.PRAGMAS'}, disco simulado: {args.latencia_commit_ms} ms/commit")
+    base = None
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory() as pasta:
+            db.DATABASE, db.SHARDS = os.path.join(pasta, "bench.db"), shards
+            db.create_tables()
+            db.fechar_conexoes()
+
+            tarefas = [(i, args.escritas, args.usuarios, args.synchronous, args.latencia_commit_ms / 1000)
+                       for i in range(args.processos)]
+            with multiprocessing.get_context("fork").Pool(args.processos) as pool:
+                inicio = time.perf_counter()
+                esperas = [t for parcial in pool.map(escrever, tarefas) for t in parcial]
+                duracao = time.perf_counter() - inicio
+
+            total = sum(conn.execute("SELECT COUNT(*) FROM transacoes").fetchone()[0] for conn in db.conexoes_shards())
+            db.fechar_conexoes()
+            vazao = total / duracao
+            base = base or vazao
+            esperas.sort()
+            print(f"{shards:>2} shard(s): {vazao:8.0f} commits/s ({vazao / base:4.2f}x) | "
+                  f"commit p50 {esperas[len(esperas) // 2] * 1000:.2f} ms | p99 {esperas[int(len(esperas) * 0.99)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark do cliente de saída do WhatsApp (whatsapp_client.ClienteWhatsApp) contra o
+servidor local benchmarks/fake_graph.py, com latência e erros 429/500 injetados.
+
+Envia uma rajada de mensagens pela fila e confere: todas entregues, ordem preservada
+por destinatário, taxa real dentro do limite configurado e número de novas tentativas.
+
+Uso: python benchmarks/bench_whatsapp.py [--mensagens 2000] [--taxa 200] [--taxa-erro 0.05]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fake_graph import FakeGraph  # noqa: E402
+from whatsapp_client import ClienteWhatsApp  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mensagens", type=int, default=2000)
+    parser.add_argument("--destinatarios", type=int, default=200)
+    parser.add_argument("--taxa", type=float, default=200, help="limite de mensagens por segundo")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latencia-ms", type=float, default=30)
+    parser.add_argument("--taxa-erro", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake = FakeGraph(latencia_ms=args.latencia_ms, taxa_erro=args.taxa_erro, semente=1).iniciar()
+    cliente = ClienteWhatsApp("token", "123", base_url=fake.url, mensagens_por_segundo=args.taxa,
+                              num_workers=args.workers, backoff_base=0.05)
+    # Sem prints por mensagem durante a medição
+    sys.stdout, stdout = open(os.devnull, "w"), sys.stdout
+
+    inicio = time.monotonic()
+    for i in range(args.mensagens):
+        cliente.enfileirar(f"55{i % args.destinatarios:09d}", str(i))
+    cliente.encerrar(timeout=600)
+    duracao = time.monotonic() - inicio
+    sys.stdout = stdout
+
+    estatisticas = cliente.obter_estatisticas()
+    entregues = fake.recebidas
+    por_destinatario = {}
+    for _, telefone, texto in entregues:
+        por_destinatario.setdefault(telefone, []).append(int(texto))
+    fora_de_ordem = sum(1 for seq in por_destinatario.values() if seq != sorted(seq))
+
+    # Maior taxa observada numa janela de 1 s (após a rajada inicial do bucket)
+    instantes = sorted(t for t, _, _ in entregues)
+    pico, j = 0, 0
+    for i, t in enumerate(instantes):
+        while instantes[j] < t - 1:
+            j += 1
+        pico = max(pico, i - j + 1)
+
+    print(f"mensagens: {args.mensagens} | entregues: {len(entregues)} | falhas: {estatisticas['falhas']}")
+    print(f"respostas do servidor: {fake.respostas} | novas tentativas: {estatisticas['novas_tentativas']}")
+    print(f"duração: {duracao:.2f}s | vazão: {len(entregues) / duracao:.0f} msg/s (limite {args.taxa:.0f}) | pico em 1 s: {pico}")
+    print(f"destinatários com mensagens fora de ordem: {fora_de_ordem}")
+    fake.parar()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Teste de carga ponta a ponta, offline: sobe o app no gunicorn apontando para o Gemini falso
+(benchmarks/fake_gemini.py) e a Graph API falsa (benchmarks/fake_graph.py), e reproduz
+payloads de webhook de um cenário (benchmarks/cenarios.py) com N usuários simultâneos.
+
+Cada usuário virtual envia uma mensagem e espera a resposta chegar na Graph API falsa antes
+da próxima; a latência medida é do POST no webhook até a entrega da resposta. Relata
+p50/p95/p99, mensagens/s, linhas gravadas no banco por segundo e chamadas ao LLM por
+mensagem, e compara com o baseline salvo em benchmarks/baselines/<cenario>.json.
+
+Uso: python benchmarks/carga.py [--cenario misto] [--concorrencia 32] [--mensagens 2000]
+                                [--latencia-gemini-ms 800] [--salvar]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import requests
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, RAIZ)
+import db  # noqa: E402
+from cenarios import CENARIOS, gerar_mensagem, preencher  # noqa: E402
+from fake_gemini import FakeGemini  # noqa: E402
+from fake_graph import FakeGraph  # noqa: E402
+
+PASTA_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+TIMEOUT_RESPOSTA = 60
+RESPOSTAS_DE_ERRO = ("Ocorreu um erro", "Não consegui processar")
+
+# Métricas comparadas com o baseline: (chave, maior é melhor)
+METRICAS = [
+    ("latencia_p50_ms", False), ("latencia_p95_ms", False), ("latencia_p99_ms", False),
+    ("ack_p99_ms", False), ("mensagens_por_s", True), ("linhas_db_por_s", True),
+    ("chamadas_llm_por_mensagem", False),
+]
+
+
+def payload(telefone, texto):
+    """Payload de webhook da Meta com uma mensagem de texto."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"id": "carga", "changes": [{"field": "messages", "value": {
+            "messaging_product": "whatsapp",
+            "metadata": {"phone_number_id": "123"},
+            "contacts": [{"wa_id": telefone}],
+            "messages": [{"from": telefone, "id": f"wamid.carga.{uuid.uuid4().hex}",
+                          "timestamp": str(int(time.time())), "type": "text", "text": {"body": texto}}],
+        }}]}],
+    }
+
+
+def percentil(valores, p):
+    return statistics.quantiles(valores, n=100, method="inclusive")[p - 1] if len(valores) > 1 else (valores or [0])[0]
+
+
+def contar_linhas():
+    """(total de transações, dívidas pagas) somados em todos os shards do app."""
+    totais = [0, 0]
+    for caminho in db.caminhos_shards():
+        conn = sqlite3.connect(caminho)
+        try:
+            linha = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tipo = 'divida' AND status = 'pago'), 0) FROM transacoes"
+            ).fetchone()
+        finally:
+            conn.close()
+        totais = [t + v for t, v in zip(totais, linha)]
+    return totais
+
+
+class Carga:
+    """Usuários virtuais: cada um tem um telefone e no máximo uma mensagem aguardando resposta."""
+
+    def __init__(self, url_webhook):
+        self.url_webhook = url_webhook
+        self._esperando = {}
+        self._lock = threading.Lock()
+        self.latencias, self.acks, self.erros, self.sem_resposta, self.recusadas = [], [], 0, 0, 0
+
+    def ao_receber(self, telefone, texto):
+        with self._lock:
+            evento = self._esperando.get(telefone)
+        if evento is not None:
+            evento.texto = texto
+            evento.set()
+
+    def enviar(self, session, telefone, texto):
+        """Envia a mensagem e espera a resposta. Retorna (ack, latência até a resposta, texto), em s, ou None."""
+        evento = threading.Event()
+        with self._lock:
+            self._esperando[telefone] = evento
+        inicio = time.perf_counter()
+        while True:
+            response = session.post(self.url_webhook, json=payload(telefone, texto), timeout=30)
+            ack = time.perf_counter() - inicio
+            if response.status_code != 503:
+                break
+            # Fila cheia: o app pediu reenvio, como a Meta faria
+            with self._lock:
+                self.recusadas += 1
+            time.sleep(0.1)
+        if not evento.wait(TIMEOUT_RESPOSTA):
+            return None
+        return ack, time.perf_counter() - inicio, evento.texto
+
+    def usuario(self, telefone, preparo, mensagens, barreira, rnd):
+        session = requests.Session()
+        for modelo in preparo:
+            self.enviar(session, telefone, preencher(modelo, rnd))
+        barreira.wait()
+        barreira.wait()  # a medição começa depois que o processo principal fotografa os contadores
+        for texto in mensagens:
+            resultado = self.enviar(session, telefone, texto)
+            with self._lock:
+                if resultado is None:
+                    self.sem_resposta += 1
+                    continue
+                ack, latencia, resposta = resultado
+                self.acks.append(ack)
+                self.latencias.append(latencia)
+                if resposta and resposta.startswith(RESPOSTAS_DE_ERRO):
+                    self.erros += 1
+        session.close()
+
+
+def subir_gunicorn(args, pasta, ambiente):
+    log = open(os.path.join(pasta, "gunicorn.log"), "w")
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--chdir", RAIZ, "-b", f"127.0.0.1:{args.porta}",
+         "-w", str(args.gunicorn_workers), "--threads", str(args.gunicorn_threads)],
+        env=ambiente, stdout=log, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{args.porta}/webhook"
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            break
+        try:
+            requests.get(url, timeout=5)
+            return processo, url
+        except (requests.ConnectionError, requests.Timeout):
+            # Socket aberto pelo master antes de o worker terminar de importar o app
+            time.sleep(0.2)
+    processo.kill()
+    sys.exit(f"gunicorn não subiu; veja {log.name}")
+
+
+def diferencas_config(atual, baseline, padroes):
+    """Opções com valor diferente do baseline; as ausentes dele (opções mais novas) valem o padrão."""
+    chaves = sorted(atual.keys() | baseline.keys())
+    return [(chave, baseline.get(chave, padroes.get(chave)), atual.get(chave, padroes.get(chave)))
+            for chave in chaves if baseline.get(chave, padroes.get(chave)) != atual.get(chave, padroes.get(chave))]
+
+
+def comparar(resultado, baseline, padroes):
+    print(f"\nComparação com o baseline ({baseline.get('commit', '?')}, {baseline.get('data', '?')}):")
+    diferencas = diferencas_config(resultado["config"], baseline.get("config", {}), padroes)
+    if diferencas:
+        # Números de configurações diferentes não são comparáveis (ex.: Gemini de 50 ms contra 800 ms)
+        print("  não comparado: a configuração difere do baseline")
+        for chave, antes, agora in diferencas:
+            print(f"  {chave:<28} {antes!s:>10} -> {agora!s:>10}")
+        return
+    for chave, maior_melhor in METRICAS:
+        antes, agora = baseline["resultados"].get(chave), resultado["resultados"][chave]
+        if not antes:
+            continue
+        delta = (agora - antes) / antes * 100
+        melhorou = delta > 0 if maior_melhor else delta < 0
+        marca = "" if abs(delta) < 5 else (" ✓" if melhorou else " ✗ regressão")
+        print(f"  {chave:<28} {antes:>10.2f} -> {agora:>10.2f}  ({delta:+.1f}%){marca}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cenario", choices=sorted(CENARIOS), default="misto")
+    parser.add_argument("--concorrencia", type=int, default=32, help="usuários virtuais simultâneos")
+    parser.add_argument("--mensagens", type=int, default=2000, help="total de mensagens medidas")
+    parser.add_argument("--shards", type=int, default=db.SHARDS, help="arquivos SQLite por user_id (DATABASE_SHARDS)")
+    parser.add_argument("--gunicorn-workers", type=int, default=1)
+    parser.add_argument("--gunicorn-threads", type=int, default=8)
+    parser.add_argument("--porta", type=int, default=8090)
+    parser.add_argument("--latencia-gemini-ms", type=float, default=800)
+    parser.add_argument("--latencia-gemini-msg-ms", type=float, default=50)
+    parser.add_argument("--latencia-graph-ms", type=float, default=30)
+    parser.add_argument("--semente", type=int, default=1)
+    parser.add_argument("--salvar", action="store_true", help="grava o resultado como novo baseline do cenário")
+    parser.add_argument("--saida", help="grava o resultado (JSON) neste arquivo")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.semente)
+    gemini = FakeGemini(latencia_ms=args.latencia_gemini_ms, latencia_msg_ms=args.latencia_gemini_msg_ms,
+                        semente=args.semente).iniciar()
+    graph = FakeGraph(latencia_ms=args.latencia_graph_ms, semente=args.semente)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_db = os.path.join(pasta, "carga.db")
+        # Migrações aplicadas antes de subir os workers do gunicorn, que abririam o banco ao mesmo tempo
+        db.DATABASE, db.SHARDS = caminho_db, args.shards
+        db.create_tables()
+        db.fechar_conexoes()
+
+        ambiente = dict(
+            os.environ, DATABASE_PATH=caminho_db, DATABASE_SHARDS=str(args.shards), GEMINI_API_ENDPOINT=gemini.url, GOOGLE_API_KEY="carga",
+            GRAPH_API_URL=graph.url, ACCESS_TOKEN="carga", PHONE_NUMBER_ID="123", VERIFY_TOKEN="carga",
+            PYTHONWARNINGS="ignore",
+        )
+        processo, url = subir_gunicorn(args, pasta, ambiente)
+        carga = Carga(url)
+        graph.ao_receber = carga.ao_receber
+        graph.iniciar()
+
+        cenario = CENARIOS[args.cenario]
+        por_usuario = [[] for _ in range(args.concorrencia)]
+        for i in range(args.mensagens):
+            por_usuario[i % args.concorrencia].append(gerar_mensagem(args.cenario, rnd))
+        barreira = threading.Barrier(args.concorrencia + 1)
+        threads = [
+            threading.Thread(target=carga.usuario, daemon=True, args=(
+                f"55119{i:08d}", cenario["preparo"], mensagens, barreira, random.Random(args.semente + i)))
+            for i, mensagens in enumerate(por_usuario)
+        ]
+        try:
+            for t in threads:
+                t.start()
+            barreira.wait()
+            linhas_antes, pagas_antes = contar_linhas()
+            chamadas_antes, mensagens_llm_antes = gemini.chamadas, gemini.mensagens
+            inicio = time.perf_counter()
+            barreira.wait()
+            for t in threads:
+                t.join()
+            duracao = time.perf_counter() - inicio
+            linhas_depois, pagas_depois = contar_linhas()
+        finally:
+            processo.terminate()
+            processo.wait(30)
+            graph.parar()
+            gemini.parar()
+
+    respondidas = len(carga.latencias)
+    linhas_gravadas = (linhas_depois - linhas_antes) + (pagas_depois - pagas_antes)
+    resultado = {
+        "cenario": args.cenario,
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                                 text=True).stdout.strip(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("salvar", "saida", "porta")},
+        "resultados": {
+            "mensagens": args.mensagens,
+            "respondidas": respondidas,
+            "sem_resposta": carga.sem_resposta,
+            "respostas_de_erro": carga.erros,
+            "recusadas_503": carga.recusadas,
+            "duracao_s": round(duracao, 3),
+            "latencia_p50_ms": round(percentil(carga.latencias, 50) * 1000, 2),
+            "latencia_p95_ms": round(percentil(carga.latencias, 95) * 1000, 2),
+            "latencia_p99_ms": round(percentil(carga.latencias, 99) * 1000, 2),
+            "ack_p99_ms": round(percentil(carga.acks, 99) * 1000, 2),
+            "mensagens_por_s": round(respondidas / duracao, 2),
+            "linhas_db": linhas_gravadas,
+            "linhas_db_por_s": round(linhas_gravadas / duracao, 2),
+            "chamadas_llm": gemini.chamadas - chamadas_antes,
+            "chamadas_llm_por_mensagem": round((gemini.chamadas - chamadas_antes) / args.mensagens, 4),
+            "mensagens_enviadas_ao_llm": gemini.mensagens - mensagens_llm_antes,
+        },
+    }
+
+    r = resultado["resultados"]
+    print(f"cenário {args.cenario}: {args.mensagens} mensagens, {args.concorrencia} usuários simultâneos, "
+          f"gunicorn {args.gunicorn_workers}x{args.gunicorn_threads}, Gemini {args.latencia_gemini_ms:.0f} ms")
+    print(f"respondidas: {respondidas} | sem resposta: {r['sem_resposta']} | respostas de erro: {r['respostas_de_erro']}"
+          f" | 503: {r['recusadas_503']}")
+    print(f"latência até a resposta: p50 {r['latencia_p50_ms']:.1f} ms | p95 {r['latencia_p95_ms']:.1f} ms"
+          f" | p99 {r['latencia_p99_ms']:.1f} ms | ack do webhook p99 {r['ack_p99_ms']:.1f} ms")
+    print(f"vazão: {r['mensagens_por_s']:.1f} msg/s | banco: {r['linhas_db_por_s']:.1f} linhas/s"
+          f" | LLM: {r['chamadas_llm_por_mensagem']:.3f} chamadas/mensagem")
+
+    arquivo_baseline = os.path.join(PASTA_BASELINES, f"{args.cenario}.json")
+    if os.path.exists(arquivo_baseline) and not args.salvar:
+        with open(arquivo_baseline) as f:
+            comparar(resultado, json.load(f), {chave: parser.get_default(chave) for chave in resultado["config"]})
+    destinos = ([args.saida] if args.saida else []) + ([arquivo_baseline] if args.salvar else [])
+    for destino in destinos:
+        os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+        with open(destino, "w") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"resultado gravado em {destino}")
+
+
+if __name__ == "__main__":
+    main()
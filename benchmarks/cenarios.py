@@ -0,0 +1,66 @@
+"""
+Cenários de carga para benchmarks/carga.py: misturas de mensagens de registro, consulta
+e baixa de dívidas, com valores e datas sorteados.
+
+Cada cenário tem um `preparo` (mensagens enviadas por cada usuário antes da medição, ex.:
+dívidas para o marcar_pago encontrar) e um `mix` de (peso, modelos de mensagem). Os modelos
+cobrem as três camadas de interpretação: classificador local, regras do extrator e o Gemini
+(frases que as regras recusam, como "comprei 2 pizzas por 90").
+"""
+import random
+
+REGISTROS = [
+    "gastei {valor} no mercado",
+    "paguei {valor} de uber ontem",
+    "R$ {valor} na farmácia",
+    "recebi {valor} do freela",
+    "conta de luz {valor} vence dia {dia}",
+    "internet {valor} vence {dia}/{mes}",
+    "comprei 2 pizzas por {valor}",
+    "torrei uns {valor} conto no bar com a galera",
+]
+CONSULTAS = [
+    "saldo",
+    "qual meu saldo?",
+    "quais contas eu tenho?",
+    "minhas dívidas",
+    "verificar contas a vencer",
+    "resumo do mês",
+    "oi",
+    "ajuda",
+]
+BAIXAS = [
+    "paguei a conta de luz",
+    "paguei a internet",
+    "quitei o aluguel",
+    "já paguei a água",
+]
+DIVIDAS = [
+    "conta de luz 180 vence dia 25",
+    "internet 99,90 vence dia 10",
+    "aluguel 1200 vence dia 5",
+    "conta de água 80 vence dia 20",
+]
+
+CENARIOS = {
+    "registrar": {"preparo": [], "mix": [(1.0, REGISTROS)]},
+    "consultar": {"preparo": REGISTROS[:2] + DIVIDAS[:1], "mix": [(1.0, CONSULTAS)]},
+    "marcar_pago": {"preparo": DIVIDAS, "mix": [(0.7, BAIXAS), (0.3, DIVIDAS)]},
+    "misto": {"preparo": DIVIDAS, "mix": [(0.6, REGISTROS), (0.3, CONSULTAS), (0.1, BAIXAS)]},
+}
+
+
+def preencher(modelo, rnd):
+    """Preenche os campos {valor}, {dia} e {mes} do modelo."""
+    return modelo.format(
+        valor=f"{rnd.randrange(5, 500)},{rnd.randrange(100):02d}" if rnd.random() < 0.3 else rnd.randrange(5, 2000),
+        dia=rnd.randrange(1, 29),
+        mes=rnd.randrange(1, 13),
+    )
+
+
+def gerar_mensagem(nome, rnd=random):
+    """Sorteia uma mensagem do mix do cenário."""
+    mix = CENARIOS[nome]["mix"]
+    modelos = rnd.choices([modelos for _, modelos in mix], weights=[peso for peso, _ in mix])[0]
+    return preencher(rnd.choice(modelos), rnd)
@@ -0,0 +1,144 @@
+"""
+Servidor local que imita o endpoint REST generateContent do Gemini
+(POST /v1beta/models/<modelo>:generateContent), para testes e benchmarks sem gastar cota.
+
+Lê as mensagens do prompt (individual ou em lote, no formato de gemini_utils) e responde
+com o JSON pré-montado da intenção reconhecida por regras simples. Latência (fixa por
+chamada + adicional por mensagem do lote) e taxa de erros 500 são configuráveis; cada
+chamada fica contada para calcular chamadas ao LLM por mensagem.
+
+Uso: python benchmarks/fake_gemini.py [--porta 8082] [--latencia-ms 800] [--latencia-msg-ms 50]
+Aponte o app para ele com GEMINI_API_ENDPOINT=http://127.0.0.1:8082
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Mensagens dentro do prompt: '"texto"' após "mensagem a seguir:" ou linhas '    N. "texto"' no lote
+PADRAO_MENSAGEM_UNICA = re.compile(r'Analise a mensagem a seguir:\s*"(.*)"', re.DOTALL)
+PADRAO_MENSAGEM_LOTE = re.compile(r'^\s+\d+\. "(.*)"$', re.MULTILINE)
+PADRAO_VALOR = re.compile(r"\d+(?:[.,]\d{1,2})?")
+
+# Regras na ordem de prioridade: (intenção, padrão)
+REGRAS = [
+    ("definir_orcamento", re.compile(r"orçamento de|orcamento de|limite de", re.IGNORECASE)),
+    ("marcar_pago", re.compile(r"^(já )?(paguei|quitei) (a |o )?[^\d]+$", re.IGNORECASE)),
+    ("registrar_divida", re.compile(r"vence|boleto|parcela|devo", re.IGNORECASE)),
+    ("registrar_receita", re.compile(r"recebi|ganhei|salário|salario|freela|caiu", re.IGNORECASE)),
+    ("registrar_gasto", re.compile(r"\d")),
+    ("consultar_orcamento", re.compile(r"resumo|relat[oó]rio|orçamento|orcamento", re.IGNORECASE)),
+    ("verificar_vencimentos", re.compile(r"vencer|vencimento", re.IGNORECASE)),
+    ("consultar_dividas", re.compile(r"d[ií]vida|contas", re.IGNORECASE)),
+    ("consultar_saldo", re.compile(r"saldo|balan[çc]o", re.IGNORECASE)),
+    ("saudacao", re.compile(r"^(oi|ol[aá]|bom dia|boa tarde|boa noite)\b", re.IGNORECASE)),
+]
+
+
+def interpretar(mensagem):
+    """Resposta pré-montada para a mensagem, no formato que gemini_utils espera."""
+    hoje = date.today()
+    intencao = next((nome for nome, padrao in REGRAS if padrao.search(mensagem)), "desconhecido")
+    valores = PADRAO_VALOR.findall(mensagem)
+    valor = float(valores[-1].replace(",", ".")) if valores else 0.0
+    dados = {
+        "intencao": intencao, "valor": None, "categoria": None, "descricao": None,
+        "data": str(hoje), "data_vencimento": None, "status": None,
+    }
+    if intencao.startswith("registrar_"):
+        dados.update(valor=valor, categoria="Outros",
+                     descricao=" ".join(PADRAO_VALOR.sub("", mensagem).split())[:60] or "sem descrição")
+        dados["status"] = "pendente" if intencao == "registrar_divida" else "pago"
+        if intencao == "registrar_divida":
+            dados["data_vencimento"] = str(hoje + timedelta(days=10))
+    elif intencao == "marcar_pago":
+        dados["descricao"] = re.sub(r"^(já )?(paguei|quitei) (a |o )?", "", mensagem, flags=re.IGNORECASE)
+    elif intencao == "definir_orcamento":
+        dados.update(valor=valor, categoria=mensagem.rsplit(" ", 1)[-1])
+    return dados
+
+
+class FakeGemini:
+    def __init__(self, porta=0, latencia_ms=0, latencia_msg_ms=0, taxa_erro=0.0, semente=None):
+        self.latencia = latencia_ms / 1000
+        self.latencia_msg = latencia_msg_ms / 1000
+        self.taxa_erro = taxa_erro
+        self.random = random.Random(semente)
+        self.chamadas = 0
+        self.mensagens = 0
+        self.erros = 0
+        self._lock = threading.Lock()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", porta), self._handler())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt = "".join(p.get("text", "") for c in corpo.get("contents", []) for p in c.get("parts", []))
+                lote = PADRAO_MENSAGEM_LOTE.findall(prompt)
+                unica = PADRAO_MENSAGEM_UNICA.search(prompt)
+                mensagens = lote or ([unica.group(1)] if unica else [])
+
+                time.sleep(fake.latencia + fake.latencia_msg * len(mensagens))
+                with fake._lock:
+                    fake.chamadas += 1
+                    fake.mensagens += len(mensagens)
+                    falhou = fake.random.random() < fake.taxa_erro
+                    fake.erros += falhou
+
+                if falhou:
+                    status, resposta = 500, {"error": {"code": 500, "message": "Internal error", "status": "INTERNAL"}}
+                else:
+                    interpretacoes = [interpretar(m) for m in mensagens]
+                    texto = json.dumps(interpretacoes if lote else (interpretacoes or [{}])[0], ensure_ascii=False)
+                    status, resposta = 200, {
+                        "candidates": [{
+                            "content": {"parts": [{"text": f"```json\n{texto}\n```"}], "role": "model"},
+                            "finishReason": "STOP", "index": 0,
+                        }],
+                    }
+                dados = json.dumps(resposta).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def iniciar(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8082)
+    parser.add_argument("--latencia-ms", type=float, default=800)
+    parser.add_argument("--latencia-msg-ms", type=float, default=50)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeGemini(args.porta, args.latencia_ms, args.latencia_msg_ms, args.taxa_erro).iniciar()
+    print(f"Fake Gemini em {fake.url} (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.parar()
@@ -0,0 +1,89 @@
+"""
+Servidor local que imita o endpoint de mensagens da Graph API do WhatsApp
+(POST /<phone_number_id>/messages), para testes e benchmarks sem tocar na Meta.
+
+Latência e taxa de erros (429/500) são configuráveis; as mensagens recebidas ficam
+registradas em memória (com o instante de chegada) para conferência, e `ao_receber`
+(opcional) é chamado a cada entrega com (telefone, texto).
+
+Uso: python benchmarks/fake_graph.py [--porta 8081] [--latencia-ms 50] [--taxa-erro 0.1]
+Aponte o app para ele com GRAPH_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGraph:
+    def __init__(self, porta=0, latencia_ms=0, taxa_erro=0.0, semente=None, ao_receber=None):
+        self.latencia = latencia_ms / 1000
+        self.ao_receber = ao_receber
+        self.taxa_erro = taxa_erro
+        self.random = random.Random(semente)
+        self.recebidas = []  # (instante, telefone, texto)
+        self.respostas = {"200": 0, "429": 0, "500": 0}
+        self._lock = threading.Lock()
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", porta), self._handler())
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como a Graph API
+
+            def do_POST(self):
+                corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if fake.latencia:
+                    time.sleep(fake.latencia)
+                with fake._lock:
+                    sorteio = fake.random.random()
+                    status = 200
+                    if sorteio < fake.taxa_erro / 2:
+                        status = 429
+                    elif sorteio < fake.taxa_erro:
+                        status = 500
+                    fake.respostas[str(status)] += 1
+                    if status == 200:
+                        fake.recebidas.append((time.monotonic(), corpo.get("to"), corpo.get("text", {}).get("body")))
+                if status == 200 and fake.ao_receber:
+                    fake.ao_receber(corpo.get("to"), corpo.get("text", {}).get("body"))
+                resposta = json.dumps({"messages": [{"id": f"wamid.{len(fake.recebidas)}"}]} if status == 200
+                                      else {"error": {"code": status}}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(resposta)))
+                self.end_headers()
+                self.wfile.write(resposta)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def iniciar(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def parar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8081)
+    parser.add_argument("--latencia-ms", type=float, default=50)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeGraph(args.porta, args.latencia_ms, args.taxa_erro).iniciar()
+    print(f"Fake Graph API em {fake.url} (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.parar()
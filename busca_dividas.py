@@ -0,0 +1,115 @@
+import os
+
+from texto_utils import palavras, trigramas, tokens_busca
+
+# Similaridade mínima (ver `similaridade`) para aceitar uma dívida
+SIMILARIDADE_MINIMA = float(os.getenv("BUSCA_SIMILARIDADE_MINIMA", "0.6"))
+# Diferença de similaridade abaixo da qual duas dívidas são consideradas empatadas
+MARGEM_EMPATE = 0.05
+
+# Palavras que aparecem em quase toda dívida e não ajudam a distinguir uma da outra
+GENERICAS = {
+    "conta", "contas", "boleto", "pagamento", "divida", "de", "da", "do", "das", "dos", "a", "o", "e",
+    "em", "no", "na", "pra", "pro", "com", "minha", "meu",
+}
+# Artigos ignorados no início ao comparar descrições exatas ("a conta de luz" = "conta de luz")
+ARTIGOS = {"a", "o", "as", "os", "um", "uma"}
+
+# Grupos de sinônimos: qualquer termo do grupo também busca pelos demais
+SINONIMOS = [
+    {"luz", "energia", "energia eletrica", "eletricidade", "enel", "light", "cemig", "copel"},
+    {"agua", "saneamento", "sabesp", "esgoto"},
+    {"internet", "wifi", "banda larga", "fibra"},
+    {"celular", "telefone", "plano do celular"},
+    {"gas", "botijao"},
+    {"cartao", "fatura", "cartao de credito"},
+    {"aluguel", "moradia"},
+    {"condominio", "taxa condominial"},
+]
+
+
+def palavras_relevantes(texto):
+    """Palavras do texto sem as genéricas (ou todas, se só houver genéricas)."""
+    todas = palavras(texto)
+    return [p for p in todas if p not in GENERICAS] or todas
+
+
+def consultas_expandidas(descricao):
+    """Listas de palavras da busca: a descrição original e suas variações por sinônimos."""
+    texto = " ".join(palavras_relevantes(descricao))
+    consultas = [texto]
+    for grupo in SINONIMOS:
+        for termo in grupo:
+            if f" {termo} " in f" {texto} ":
+                consultas.extend(f" {texto} ".replace(f" {termo} ", f" {sinonimo} ") for sinonimo in grupo - {termo})
+    return [c.split() for c in consultas if c.strip()]
+
+
+def _dice(a, b):
+    return 2 * len(a & b) / (len(a) + len(b)) if a or b else 0.0
+
+
+def similaridade(consultas, descricao):
+    """
+    Cada palavra da consulta é comparada com a palavra mais parecida da descrição (coeficiente
+    de Dice dos trigramas, simétrico: "gas" não casa com "gasolina"); vale a média das palavras
+    da melhor consulta. Palavras da descrição sem correspondente ("conta de luz" para "luz") não contam.
+    """
+    alvo = [trigramas(p) for p in palavras_relevantes(descricao)]
+    if not alvo:
+        return 0.0
+
+    def nota(consulta):
+        return sum(max(_dice(trigramas(p), t) for t in alvo) for p in consulta) / len(consulta)
+
+    return max((nota(c) for c in consultas), default=0.0)
+
+
+def buscar_dividas(conn, user_id, descricao, limite=20):
+    """
+    Dívidas pendentes do usuário parecidas com `descricao`, da mais para a menos similar.
+    Usa o índice FTS5 (dividas_fts) para achar candidatas e recalcula a similaridade de cada uma.
+    Retorna tuplas (id, descricao, valor, data_vencimento, similaridade, tipo).
+    """
+    consultas = consultas_expandidas(descricao)
+    tokens = set(tokens_busca(user_id, " ".join(p for c in consultas for p in c)).split())
+    if not tokens:
+        return []
+    linhas = conn.execute(
+        """
+        SELECT t.id, t.descricao, t.valor, t.data_vencimento, t.tipo FROM dividas_fts f
+        JOIN transacoes t ON t.id = f.rowid
+        WHERE dividas_fts MATCH ? AND t.user_id = ? AND t.status = 'pendente'
+        ORDER BY bm25(dividas_fts) LIMIT ?
+        """,
+        (" OR ".join(f'"{t}"' for t in sorted(tokens)), user_id, limite)
+    ).fetchall()
+    candidatas = [linha[:4] + (similaridade(consultas, linha[1]), linha[4]) for linha in linhas]
+    return sorted(candidatas, key=lambda c: (-c[4], c[3] or ""))
+
+
+def _descricao_exata(texto):
+    ps = palavras(texto)
+    while ps and ps[0] in ARTIGOS:
+        ps.pop(0)
+    return " ".join(ps)
+
+
+def escolher_divida(candidatas, descricao=None, minimo=SIMILARIDADE_MINIMA):
+    """
+    Decide qual dívida foi paga. Retorna (divida, empatadas): a dívida escolhida ou None e,
+    quando dívidas diferentes empatam como melhor resultado, a lista delas para o usuário escolher.
+    Dívidas com a mesma descrição (ex.: a luz de dois meses) não contam como empate:
+    vale a de vencimento mais próximo. Uma dívida com exatamente a `descricao` buscada vence
+    o empate, para que a resposta com a descrição completa ("conta de luz" e não "luz") resolva.
+    """
+    aceitas = [c for c in candidatas if c[4] >= minimo]
+    if not aceitas:
+        return None, []
+    melhores = [c for c in aceitas if c[4] >= aceitas[0][4] - MARGEM_EMPATE]
+    if descricao is not None:
+        exatas = [c for c in melhores if _descricao_exata(c[1]) == _descricao_exata(descricao)]
+        melhores = exatas or melhores
+    if len({" ".join(palavras(c[1])) for c in melhores}) > 1:
+        return None, melhores
+    return min(melhores, key=lambda c: c[3] or ""), []
@@ -0,0 +1,150 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from db import get_db
+from texto_utils import normalizar
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    """Cache em memória com limite de itens (LRU) e tempo de expiração por item. Thread-safe."""
+
+    def __init__(self, max_itens=10000, ttl=3600):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return padrao
+            valor, expira_em = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return padrao
+            self._itens.move_to_end(chave)
+            return valor
+
+    def __contains__(self, chave):
+        return self.get(chave, _AUSENTE) is not _AUSENTE
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def remover(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+
+# Pontuação é descartada, exceto "." e "," entre dígitos ("1.234,56" continua diferente de "1234 56")
+_PONTUACAO_FORA_DE_NUMEROS = re.compile(r"(?<!\d)[.,]|[.,](?!\d)")
+
+
+def normalizar_mensagem(texto):
+    """Minúsculas, sem acentos, emoji e pontuação, com espaços colapsados."""
+    texto = "".join(c if c.isalnum() or c in ".," else " " for c in normalizar(texto))
+    texto = _PONTUACAO_FORA_DE_NUMEROS.sub(" ", texto)
+    return " ".join(texto.split())
+
+
+class CacheInterpretacao:
+    """
+    Cache das respostas do Gemini, chaveado pela mensagem normalizada e pela data de hoje
+    (o prompt embute "hoje"/"amanhã", então a virada do dia invalida tudo automaticamente).
+    Tem um nível em memória (LRU com TTL) e, opcionalmente, um nível persistente no SQLite.
+    """
+
+    def __init__(self, max_itens=5000, ttl=6 * 3600, persistente=False):
+        self.memoria = CacheLRU(max_itens=max_itens, ttl=ttl)
+        self.ttl = ttl
+        self.persistente = persistente
+        self._lock = threading.Lock()
+        self._dia_expurgado = None
+        self.contadores = {"hits_memoria": 0, "hits_persistente": 0, "misses": 0, "segundos_economizados": 0.0}
+        # Latência média das chamadas ao Gemini, usada para estimar o tempo economizado por hit
+        self._latencia_media = 0.0
+
+    def _chave(self, mensagem):
+        return f"{date.today()}|{normalizar_mensagem(mensagem)}"
+
+    def _contar(self, chave):
+        with self._lock:
+            self.contadores[chave] += 1
+            if chave != "misses":
+                self.contadores["segundos_economizados"] += self._latencia_media
+
+    def get(self, mensagem):
+        """Retorna uma cópia do resultado em cache para a mensagem, ou None."""
+        chave = self._chave(mensagem)
+        resposta = self.memoria.get(chave)
+        if resposta is not None:
+            self._contar("hits_memoria")
+            return json.loads(resposta)
+
+        if self.persistente:
+            self._expurgar_dias_anteriores()
+            row = get_db().execute(
+                "SELECT resposta FROM cache_interpretacao WHERE chave = ? AND criado_em > ?",
+                (chave, time.time() - self.ttl)
+            ).fetchone()
+            if row:
+                self.memoria.set(chave, row[0])
+                self._contar("hits_persistente")
+                return json.loads(row[0])
+
+        self._contar("misses")
+        return None
+
+    def set(self, mensagem, dados, latencia=None):
+        """Guarda o resultado interpretado. `latencia` (s) da chamada alimenta a estimativa de economia."""
+        chave = self._chave(mensagem)
+        resposta = json.dumps(dados, ensure_ascii=False)
+        self.memoria.set(chave, resposta)
+        if latencia is not None:
+            with self._lock:
+                self._latencia_media = latencia if not self._latencia_media else 0.9 * self._latencia_media + 0.1 * latencia
+        if self.persistente:
+            conn = get_db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_interpretacao (chave, dia, resposta, criado_em) VALUES (?, ?, ?, ?)",
+                    (chave, str(date.today()), resposta, time.time())
+                )
+
+    def _expurgar_dias_anteriores(self):
+        # Uma vez por dia, apaga as entradas de dias anteriores (nunca mais serão consultadas)
+        hoje = str(date.today())
+        if self._dia_expurgado == hoje:
+            return
+        self._dia_expurgado = hoje
+        conn = get_db()
+        with conn:
+            conn.execute("DELETE FROM cache_interpretacao WHERE dia < ?", (hoje,))
+
+    def obter_estatisticas(self):
+        with self._lock:
+            estatisticas = dict(self.contadores)
+        consultas = estatisticas["hits_memoria"] + estatisticas["hits_persistente"] + estatisticas["misses"]
+        hits = consultas - estatisticas["misses"]
+        estatisticas["taxa_acerto"] = hits / consultas if consultas else 0.0
+        estatisticas["segundos_economizados"] = round(estatisticas["segundos_economizados"], 3)
+        return estatisticas
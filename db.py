@@ -1,17 +1,103 @@
+import os
 import sqlite3
+import sys
+import threading
+import zlib
 
-DATABASE = 'financeiro.db'
+from texto_utils import tokens_busca
 
-def get_db():
-    conn = sqlite3.connect(DATABASE)
+DATABASE = os.getenv("DATABASE_PATH", 'financeiro.db')
+# Dados por usuário (transações, agregados, orçamentos, lembretes) divididos em N arquivos pelo
+# crc32 do user_id. Com 1 (padrão) fica tudo em DATABASE; as tabelas globais (deduplicação e
+# cache do Gemini) ficam sempre em DATABASE.
+SHARDS = int(os.getenv("DATABASE_SHARDS", "1"))
+
+# Ajustes de desempenho aplicados a cada conexão nova
+CACHED_STATEMENTS = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",          # leitores não bloqueiam o escritor
+    "PRAGMA synchronous = NORMAL",        # seguro com WAL e bem mais rápido que FULL
+    "PRAGMA cache_size = -20000",         # ~20 MB de cache de páginas por conexão
+    "PRAGMA mmap_size = 268435456",       # 256 MB de leitura via mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+# Uma conexão reutilizável por thread (e por arquivo de banco)
+_local = threading.local()
+
+def caminho_shard(indice, shards=None):
+    """Arquivo do shard `indice` de `shards`; o nome inclui o total para que layouts diferentes convivam."""
+    shards = SHARDS if shards is None else shards
+    if shards == 1:
+        return DATABASE
+    raiz, extensao = os.path.splitext(DATABASE)
+    return f"{raiz}.shard-{indice}-de-{shards}{extensao}"
+
+def shard_do_usuario(user_id, shards=None):
+    # crc32 é estável entre processos (o mesmo critério da fila de mensagens)
+    return zlib.crc32(str(user_id).encode()) % (SHARDS if shards is None else shards)
+
+def caminhos_shards(shards=None):
+    return [caminho_shard(i, shards) for i in range(SHARDS if shards is None else shards)]
+
+def conectar(caminho):
+    """Retorna a conexão da thread atual com o arquivo, abrindo e configurando uma nova se necessário."""
+    conexoes = getattr(_local, "conexoes", None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conn = conexoes.get(caminho)
+    if conn is None:
+        conn = sqlite3.connect(caminho, cached_statements=CACHED_STATEMENTS)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        # Tokens do índice de busca de dívidas (migrações 7 e 8 e reindexar_dividas)
+        conn.create_function("tokens_busca", 2, tokens_busca, deterministic=True)
+        conexoes[caminho] = conn
     return conn
 
-def create_tables():
-    # Corrigido de get_di() para get_db()
-    conn = get_db()
-    c = conn.cursor()
-    # Tabela de transações evoluída para incluir status e data de vencimento
-    c.execute('''
+def get_db(user_id=None):
+    """
+    Conexão da thread atual: com o shard do usuário, se `user_id` for informado,
+    ou com o banco principal (tabelas globais).
+    """
+    if user_id is None or SHARDS == 1:
+        return conectar(DATABASE)
+    return conectar(caminho_shard(shard_do_usuario(user_id)))
+
+def conexoes_shards():
+    """Uma conexão por shard, para as rotinas que percorrem todos os usuários."""
+    return [conectar(caminho) for caminho in caminhos_shards()]
+
+def fechar_conexoes():
+    """Fecha as conexões abertas pela thread atual."""
+    for conn in getattr(_local, "conexoes", {}).values():
+        conn.close()
+    _local.conexoes = {}
+
+# Agregados calculados em lote a partir de `transacoes` (usados na migração 3 e em reconstruir_agregados)
+SQL_SALDOS_CALCULADOS = '''
+    SELECT user_id,
+           SUM(CASE WHEN tipo = 'receita' THEN valor ELSE 0 END),
+           SUM(CASE WHEN tipo = 'despesa' THEN valor ELSE 0 END)
+    FROM transacoes WHERE status = 'pago' AND tipo IN ('receita', 'despesa')
+    GROUP BY user_id
+'''
+SQL_RESUMO_MENSAL_CALCULADO = '''
+    SELECT user_id, substr(data, 1, 7), tipo, SUM(valor), COUNT(*)
+    FROM transacoes WHERE status = 'pago'
+    GROUP BY user_id, substr(data, 1, 7), tipo
+'''
+# Índice de busca de dívidas (dividas_fts) refeito a partir de `transacoes` (migrações 7 e 8 e reindexar_dividas)
+SQL_INDICE_DIVIDAS_CALCULADO = (
+    "INSERT INTO dividas_fts (rowid, tokens) SELECT id, tokens_busca(user_id, descricao) FROM transacoes WHERE status = 'pendente'"
+)
+
+# Migrações versionadas, aplicadas em ordem conforme o PRAGMA user_version do banco
+MIGRACOES = [
+    (1, "tabelas iniciais", [
+        # Tabela de transações evoluída para incluir status e data de vencimento
+        '''
         CREATE TABLE IF NOT EXISTS transacoes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id TEXT NOT NULL,
@@ -23,10 +109,340 @@ def create_tables():
             data_vencimento TEXT, -- Apenas para dívidas
             status TEXT NOT NULL -- 'pago', 'pendente'
         )
-    ''')
-    conn.commit()
-    conn.close()
+        ''',
+        # Ids de mensagens do WhatsApp já processadas (deduplicação de reentregas do webhook)
+        '''
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            message_id TEXT PRIMARY KEY,
+            recebido_em TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (2, "índices compostos por usuário", [
+        # Dívidas pendentes e vencimentos próximos, já ordenados por vencimento
+        "CREATE INDEX IF NOT EXISTS idx_transacoes_user_status_venc ON transacoes (user_id, status, data_vencimento)",
+        # Somatórios de saldo: índice de cobertura, sem acessar a tabela
+        "CREATE INDEX IF NOT EXISTS idx_transacoes_user_tipo_status ON transacoes (user_id, tipo, status, valor)",
+        "CREATE INDEX IF NOT EXISTS idx_processed_messages_recebido ON processed_messages (recebido_em)",
+    ]),
+    (3, "saldos e resumos mensais mantidos incrementalmente", [
+        # Totais pagos por usuário: o saldo vira uma busca pela chave primária
+        '''
+        CREATE TABLE IF NOT EXISTS saldos (
+            user_id TEXT PRIMARY KEY,
+            total_receitas REAL NOT NULL DEFAULT 0,
+            total_despesas REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        # Totais pagos por usuário, mês (AAAA-MM) e tipo
+        '''
+        CREATE TABLE IF NOT EXISTS resumo_mensal (
+            user_id TEXT NOT NULL,
+            mes TEXT NOT NULL,
+            tipo TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, mes, tipo)
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR REPLACE INTO saldos (user_id, total_receitas, total_despesas)" + SQL_SALDOS_CALCULADOS,
+        "INSERT OR REPLACE INTO resumo_mensal (user_id, mes, tipo, total, quantidade)" + SQL_RESUMO_MENSAL_CALCULADO,
+    ]),
+    (4, "orçamentos por categoria e índice para relatórios", [
+        # Limite mensal de gastos definido pelo usuário para cada categoria
+        '''
+        CREATE TABLE IF NOT EXISTS orcamentos (
+            user_id TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            limite REAL NOT NULL,
+            PRIMARY KEY (user_id, categoria)
+        ) WITHOUT ROWID
+        ''',
+        # Relatórios por período: índice de cobertura sobre as transações pagas do usuário
+        "CREATE INDEX IF NOT EXISTS idx_transacoes_user_status_data ON transacoes (user_id, status, data, tipo, categoria, valor)",
+    ]),
+    (5, "cache persistente das interpretações do Gemini", [
+        '''
+        CREATE TABLE IF NOT EXISTS cache_interpretacao (
+            chave TEXT PRIMARY KEY, -- 'AAAA-MM-DD|mensagem normalizada'
+            dia TEXT NOT NULL,
+            resposta TEXT NOT NULL, -- JSON retornado pelo Gemini
+            criado_em REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_cache_interpretacao_dia ON cache_interpretacao (dia)",
+    ]),
+    (6, "lembretes de vencimento", [
+        # Varredura global das dívidas pendentes por data de vencimento (índice parcial: só pendentes)
+        "CREATE INDEX IF NOT EXISTS idx_transacoes_pendentes_venc ON transacoes (data_vencimento, user_id) WHERE status = 'pendente'",
+        # Lembretes já enviados; o vencimento faz parte da chave para notificar de novo se ele mudar
+        '''
+        CREATE TABLE IF NOT EXISTS lembretes_enviados (
+            transacao_id INTEGER NOT NULL,
+            data_vencimento TEXT NOT NULL,
+            enviado_em TEXT NOT NULL,
+            PRIMARY KEY (transacao_id, data_vencimento)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (7, "busca aproximada de dívidas pendentes (FTS5)", [
+        # Um documento por dívida pendente (rowid = transacoes.id), com os trigramas da descrição
+        # sem acentos prefixados pelo user_id: cada consulta só lê as dívidas do próprio usuário
+        "CREATE VIRTUAL TABLE IF NOT EXISTS dividas_fts USING fts5(tokens)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_dividas_fts_insert AFTER INSERT ON transacoes
+        WHEN new.status = 'pendente'
+        BEGIN
+            INSERT INTO dividas_fts (rowid, tokens) VALUES (new.id, tokens_busca(new.user_id, new.descricao));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_dividas_fts_update AFTER UPDATE OF status, descricao, user_id ON transacoes
+        BEGIN
+            DELETE FROM dividas_fts WHERE rowid = old.id;
+            INSERT INTO dividas_fts (rowid, tokens)
+            SELECT new.id, tokens_busca(new.user_id, new.descricao) WHERE new.status = 'pendente';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_dividas_fts_delete AFTER DELETE ON transacoes
+        WHEN old.status = 'pendente'
+        BEGIN
+            DELETE FROM dividas_fts WHERE rowid = old.id;
+        END
+        ''',
+        # Idempotente: refaz o índice mesmo que uma execução anterior tenha parado no meio
+        "DELETE FROM dividas_fts",
+        SQL_INDICE_DIVIDAS_CALCULADO,
+    ]),
+    (8, "palavras curtas no índice de busca de dívidas", [
+        # tokens_busca passou a incluir palavras de 1 e 2 letras ("tv"): refaz o índice
+        "DELETE FROM dividas_fts",
+        SQL_INDICE_DIVIDAS_CALCULADO,
+    ]),
+    (9, "índice de busca de dívidas mantido pelo app, sem triggers", [
+        # Os triggers chamavam tokens_busca, que só existe nas conexões abertas por `conectar`:
+        # qualquer outra ferramenta (CLI do sqlite3, scripts de backup) não conseguia mais gravar em
+        # transacoes. O índice passa a ser mantido por indexar_dividas/desindexar_dividas.
+        "DROP TRIGGER IF EXISTS trg_dividas_fts_insert",
+        "DROP TRIGGER IF EXISTS trg_dividas_fts_update",
+        "DROP TRIGGER IF EXISTS trg_dividas_fts_delete",
+    ]),
+]
+
+def create_tables(ate_versao=None):
+    """Aplica as migrações pendentes (até `ate_versao`, se informado) no banco principal e em cada shard."""
+    # Corrigido de get_di() para get_db()
+    for caminho in dict.fromkeys([DATABASE] + caminhos_shards()):
+        migrar(conectar(caminho), ate_versao)
+
+# Espera pelo lock de escrita enquanto outro processo aplica uma migração (ex.: o backfill da 7)
+BUSY_TIMEOUT_MIGRACAO_MS = 600_000
+
+def migrar(conn, ate_versao=None):
+    """
+    Aplica cada migração pendente em uma transação BEGIN IMMEDIATE. Vários processos podem subir
+    juntos (workers do gunicorn, worker de lembretes): só um aplica cada versão, e os demais, ao
+    obter o lock, releem o user_version e pulam o que já foi aplicado.
+    """
+    busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MIGRACAO_MS}")
+    try:
+        for versao, descricao, comandos in MIGRACOES:
+            if ate_versao is not None and versao > ate_versao:
+                break
+            if versao <= conn.execute("PRAGMA user_version").fetchone()[0]:
+                continue
+            # DDL não abre transação implícita no sqlite3: sem o BEGIN explícito cada comando
+            # seria efetivado sozinho e um processo concorrente veria a migração pela metade
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if versao <= conn.execute("PRAGMA user_version").fetchone()[0]:
+                    conn.rollback()
+                    continue
+                for comando in comandos:
+                    conn.execute(comando)
+                conn.execute(f"PRAGMA user_version = {versao}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            print(f"Migração {versao} aplicada: {descricao}")
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+
+def atualizar_agregados(conn, user_id, transacoes):
+    """
+    Soma as transações pagas em `saldos` e `resumo_mensal`.
+    Deve ser chamada dentro da mesma transação que gravou/alterou as linhas.
+    `transacoes` é uma lista de (tipo, valor, data, status).
+    """
+    pagas = [(tipo, float(valor), data) for tipo, valor, data, status in transacoes if status == 'pago']
+    if not pagas:
+        return
+    receitas = sum(valor for tipo, valor, _ in pagas if tipo == 'receita')
+    despesas = sum(valor for tipo, valor, _ in pagas if tipo == 'despesa')
+    if receitas or despesas:
+        conn.execute(
+            '''
+            INSERT INTO saldos (user_id, total_receitas, total_despesas) VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total_receitas = total_receitas + excluded.total_receitas,
+                total_despesas = total_despesas + excluded.total_despesas
+            ''',
+            (user_id, receitas, despesas)
+        )
+    conn.executemany(
+        '''
+        INSERT INTO resumo_mensal (user_id, mes, tipo, total, quantidade) VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (user_id, mes, tipo) DO UPDATE SET
+            total = total + excluded.total,
+            quantidade = quantidade + 1
+        ''',
+        [(user_id, data[:7], tipo, valor) for tipo, valor, data in pagas]
+    )
+
+def indexar_dividas(conn, dividas):
+    """
+    Adiciona ao índice de busca as dívidas pendentes recém-gravadas, dadas como (id, user_id, descricao).
+    Deve ser chamada dentro da mesma transação que gravou as linhas.
+    """
+    conn.executemany(
+        "INSERT INTO dividas_fts (rowid, tokens) VALUES (?, ?)",
+        [(id_, tokens_busca(user_id, descricao)) for id_, user_id, descricao in dividas]
+    )
+
+def desindexar_dividas(conn, ids):
+    """Remove do índice de busca as dívidas que deixaram de estar pendentes, na mesma transação da mudança."""
+    conn.executemany("DELETE FROM dividas_fts WHERE rowid = ?", [(id_,) for id_ in ids])
+
+def reindexar_dividas(conexoes=None):
+    """Refaz o índice de busca de dívidas a partir de `transacoes`, shard a shard (ex.: após edições por fora do app)."""
+    for conn in conexoes or conexoes_shards():
+        with conn:
+            conn.execute("DELETE FROM dividas_fts")
+            conn.execute(SQL_INDICE_DIVIDAS_CALCULADO)
+
+def reconstruir_agregados(conexoes=None):
+    """Recalcula `saldos` e `resumo_mensal` a partir de `transacoes`, em lote, shard a shard."""
+    for conn in conexoes or conexoes_shards():
+        with conn:
+            conn.execute("DELETE FROM saldos")
+            conn.execute("DELETE FROM resumo_mensal")
+            conn.execute("INSERT INTO saldos (user_id, total_receitas, total_despesas)" + SQL_SALDOS_CALCULADOS)
+            conn.execute("INSERT INTO resumo_mensal (user_id, mes, tipo, total, quantidade)" + SQL_RESUMO_MENSAL_CALCULADO)
+
+def verificar_agregados(tolerancia=0.005):
+    """Compara os agregados mantidos com os recalculados. Retorna a lista de divergências."""
+    divergencias = []
+    for conn in conexoes_shards():
+        divergencias.extend(_verificar_agregados(conn, tolerancia))
+    return divergencias
+
+def _verificar_agregados(conn, tolerancia):
+    divergencias = []
+
+    calculados = {row[0]: row[1:] for row in conn.execute(SQL_SALDOS_CALCULADOS)}
+    mantidos = {row[0]: row[1:] for row in conn.execute("SELECT user_id, total_receitas, total_despesas FROM saldos")}
+    for user_id in calculados.keys() | mantidos.keys():
+        esperado, atual = calculados.get(user_id, (0, 0)), mantidos.get(user_id, (0, 0))
+        if any(abs(e - a) > tolerancia for e, a in zip(esperado, atual)):
+            divergencias.append(("saldos", user_id, esperado, atual))
+
+    calculados = {row[:3]: row[3:] for row in conn.execute(SQL_RESUMO_MENSAL_CALCULADO)}
+    mantidos = {row[:3]: row[3:] for row in conn.execute("SELECT user_id, mes, tipo, total, quantidade FROM resumo_mensal")}
+    for chave in calculados.keys() | mantidos.keys():
+        esperado, atual = calculados.get(chave, (0, 0)), mantidos.get(chave, (0, 0))
+        if abs(esperado[0] - atual[0]) > tolerancia or esperado[1] != atual[1]:
+            divergencias.append(("resumo_mensal", chave, esperado, atual))
+
+    return divergencias
+
+COLUNAS_TRANSACAO = "user_id, tipo, categoria, valor, data, descricao, data_vencimento, status"
+
+def redistribuir(de, para, tamanho_lote=5000):
+    """
+    Copia os dados por usuário do layout com `de` shards para um novo layout com `para` shards
+    (ex.: de 1 para 8, saindo do arquivo único). Os ids das transações são renumerados em cada
+    destino, `lembretes_enviados` acompanha a renumeração e os agregados e o índice de busca
+    de dívidas são recalculados.
+    Os arquivos de origem não são alterados: depois de conferir, troque DATABASE_SHARDS e
+    reinicie o app. Deve rodar com o app parado. Retorna o número de transações copiadas.
+    """
+    origens, destinos = caminhos_shards(de), caminhos_shards(para)
+    if set(origens) & set(destinos):
+        raise ValueError("Origem e destino usam os mesmos arquivos")
+    conexoes_destino = [conectar(caminho) for caminho in destinos]
+    for caminho, conn in zip(destinos, conexoes_destino):
+        migrar(conn)
+        if conn.execute("SELECT 1 FROM transacoes LIMIT 1").fetchone():
+            raise ValueError(f"{caminho} já tem transações")
+
+    copiadas = 0
+    for caminho in origens:
+        origem = conectar(caminho)
+        migrar(origem)
+        # Só os ids com lembrete enviado precisam ser lembrados depois da renumeração
+        com_lembrete = {id_ for (id_,) in origem.execute("SELECT DISTINCT transacao_id FROM lembretes_enviados")}
+        novos_ids = {}
+        cursor = origem.execute(f"SELECT id, {COLUNAS_TRANSACAO} FROM transacoes ORDER BY id")
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            por_destino = {}
+            for linha in linhas:
+                por_destino.setdefault(shard_do_usuario(linha[1], para), []).append(linha)
+            for indice, grupo in por_destino.items():
+                conn = conexoes_destino[indice]
+                with conn:
+                    for linha in grupo:
+                        c = conn.execute(f"INSERT INTO transacoes ({COLUNAS_TRANSACAO}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linha[1:])
+                        if linha[0] in com_lembrete:
+                            novos_ids[linha[0]] = (indice, c.lastrowid)
+            copiadas += len(linhas)
+            print(f"{caminho}: {copiadas} transações copiadas")
+
+        lembretes = {}
+        for transacao_id, vencimento, enviado_em in origem.execute("SELECT transacao_id, data_vencimento, enviado_em FROM lembretes_enviados"):
+            if transacao_id in novos_ids:
+                indice, novo_id = novos_ids[transacao_id]
+                lembretes.setdefault(indice, []).append((novo_id, vencimento, enviado_em))
+        orcamentos = {}
+        for linha in origem.execute("SELECT user_id, categoria, limite FROM orcamentos"):
+            orcamentos.setdefault(shard_do_usuario(linha[0], para), []).append(linha)
+        for indice, conn in enumerate(conexoes_destino):
+            with conn:
+                conn.executemany("INSERT INTO lembretes_enviados (transacao_id, data_vencimento, enviado_em) VALUES (?, ?, ?)",
+                                 lembretes.get(indice, []))
+                conn.executemany("INSERT INTO orcamentos (user_id, categoria, limite) VALUES (?, ?, ?)",
+                                 orcamentos.get(indice, []))
+
+    reconstruir_agregados(conexoes_destino)
+    reindexar_dividas(conexoes_destino)
+    no_destino = sum(conn.execute("SELECT COUNT(*) FROM transacoes").fetchone()[0] for conn in conexoes_destino)
+    if no_destino != copiadas:
+        raise RuntimeError(f"Esperadas {copiadas} transações nos destinos, encontradas {no_destino}")
+    return copiadas
 
 if __name__ == '__main__':
     create_tables()
-
+    comando = sys.argv[1] if len(sys.argv) > 1 else None
+    if comando == "verificar":
+        divergencias = verificar_agregados()
+        for tabela, chave, esperado, atual in divergencias:
+            print(f"[{tabela}] {chave}: esperado {esperado}, encontrado {atual}")
+        print(f"{len(divergencias)} divergência(s) encontrada(s).")
+        sys.exit(1 if divergencias else 0)
+    elif comando == "reconstruir":
+        reconstruir_agregados()
+        print("Agregados reconstruídos a partir de transacoes.")
+    elif comando == "reindexar":
+        reindexar_dividas()
+        print("Índice de busca de dívidas refeito a partir de transacoes.")
+    elif comando == "redistribuir":
+        # python db.py redistribuir <shards de origem> <shards de destino>
+        de, para = int(sys.argv[2]), int(sys.argv[3])
+        copiadas = redistribuir(de, para)
+        print(f"{copiadas} transações redistribuídas de {de} para {para} shard(s): {', '.join(caminhos_shards(para))}")
+        print(f"Confira os arquivos e reinicie o app com DATABASE_SHARDS={para}.")
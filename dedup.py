@@ -0,0 +1,59 @@
+import threading
+from datetime import datetime, timedelta
+
+from cache import CacheLRU
+from db import get_db
+
+
+class Deduplicador:
+    """
+    Descarta reentregas do webhook pelo id da mensagem do WhatsApp.
+    Um LRU em memória responde a maioria das consultas; a tabela processed_messages
+    garante a deduplicação entre reinícios e entre processos do gunicorn.
+    """
+
+    def __init__(self, max_itens=50000, ttl=3600, dias_retencao=7):
+        self.memoria = CacheLRU(max_itens=max_itens, ttl=ttl)
+        self._lock = threading.Lock()
+        self.contadores = {"hits_memoria": 0, "hits_banco": 0, "novas": 0}
+        self._expurgar(dias_retencao)
+
+    def _contar(self, chave):
+        with self._lock:
+            self.contadores[chave] += 1
+
+    def registrar(self, message_id):
+        """Marca a mensagem como processada. Retorna True se for nova e False se for duplicada."""
+        if message_id in self.memoria:
+            self._contar("hits_memoria")
+            return False
+
+        conn = get_db()
+        with conn:
+            c = conn.execute(
+                "INSERT OR IGNORE INTO processed_messages (message_id, recebido_em) VALUES (?, ?)",
+                (message_id, datetime.now().isoformat(timespec='seconds'))
+            )
+            nova = c.rowcount == 1
+
+        self.memoria.set(message_id, True)
+        self._contar("novas" if nova else "hits_banco")
+        return nova
+
+    def esquecer(self, message_id):
+        """Desfaz o registro, para que uma reentrega seja processada (ex.: a fila estava cheia)."""
+        self.memoria.remover(message_id)
+        conn = get_db()
+        with conn:
+            conn.execute("DELETE FROM processed_messages WHERE message_id = ?", (message_id,))
+
+    def obter_estatisticas(self):
+        with self._lock:
+            return dict(self.contadores)
+
+    def _expurgar(self, dias_retencao):
+        # A Meta só reenvia por algumas horas; ids antigos não precisam ser guardados
+        limite = (datetime.now() - timedelta(days=dias_retencao)).isoformat(timespec='seconds')
+        conn = get_db()
+        with conn:
+            conn.execute("DELETE FROM processed_messages WHERE recebido_em < ?", (limite,))
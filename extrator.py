@@ -0,0 +1,226 @@
+import re
+from datetime import date, timedelta
+
+from texto_utils import normalizar
+
+# --- Padrões compilados uma única vez ---
+
+# Valores em BRL: "R$50", "R$ 1.234,56", "50 reais", "2000", "49,90", "12.5"
+_NUMERO = r"\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+PADRAO_VALOR = re.compile(
+    rf"(?:r\$\s*(?P<com_simbolo>{_NUMERO}))|(?P<numero>{_NUMERO})(?:\s*(?:reais|real|conto|pila)\b)?"
+)
+
+# Datas relativas e explícitas
+PADRAO_DATA = re.compile(
+    r"\b(?:(?P<depois_amanha>depois de amanha)|(?P<amanha>amanha)|(?P<hoje>hoje)|(?P<ontem>ontem)"
+    r"|(?:dia\s+(?P<dia>\d{1,2}))"
+    r"|(?P<dia_mes>\d{1,2})/(?P<mes>\d{1,2})(?:/(?P<ano>\d{2,4}))?)\b"
+)
+
+# Verbos/expressões -> intenção. A ordem importa: a primeira regra que casar vence.
+REGRAS_INTENCAO = [
+    ("registrar_divida", re.compile(r"\b(vence|vencimento|vencendo|boleto|devo|parcela)\b")),
+    ("registrar_receita", re.compile(r"\b(recebi|ganhei|salario|entrou|caiu|freela|renda|pix recebido)\b")),
+    ("registrar_gasto", re.compile(r"\b(gastei|paguei|comprei|gasto|torrei|despesa)\b")),
+]
+# Mensagens que citam um valor sem registrá-lo: perguntas ("quanto gastei em 2025?"),
+# negações ("não gastei 50") e pedidos de edição ("apaga o gasto de 50") vão para o Gemini
+PADRAO_PERGUNTA = re.compile(r"\?|\b(quanto|quanta|quantos|quantas|qual|quais|quando|onde)\b")
+PADRAO_NEGACAO = re.compile(r"\b(nao|nunca|nem)\b")
+PADRAO_EDICAO = re.compile(
+    r"\b(apaga|apagar|apague|cancela|cancelar|cancele|exclui|excluir|exclua|remove|remover|remova"
+    r"|deleta|deletar|delete|corrige|corrigir|corrija|edita|editar|edite|altera|alterar|altere"
+    r"|mudar|mude|desfaz|desfazer|desfaca|estorna|estornar|estorne)\b"
+)
+# Palavras de consulta que não cabem em uma descrição de transação
+PADRAO_CONSULTA = re.compile(
+    r"\b(quanto|quanta|quantos|quantas|qual|quais|quando|onde|total|saldo|extrato|resumo|relatorio|ultimos|ultimas)\b"
+)
+# Multiplicador logo após o valor ("1,5 mil", "50k", "2 milhões"), ou letra colada nele: fica para o Gemini
+PADRAO_MAGNITUDE = re.compile(r"[a-z]|\s*(mil|milhao|milhoes|mi|bi|bilhao|bilhoes|k)\b")
+# Palavra logo após um número sem moeda que indica quantidade, não valor ("2 boletos", "30 dias")
+PADRAO_QUANTIDADE = re.compile(r"\s*(?P<palavra>[a-z]+s|mes|semana|ano|hora|vez)\b")
+# "paguei a conta de luz de 150": pode ser a baixa de uma dívida já registrada ou um gasto novo
+PADRAO_PAGAMENTO_DE_CONTA = re.compile(
+    r"\b(paguei|quitei)\b.*\b(conta|boleto|fatura|parcela|prestacao|mensalidade)s?\b"
+    r"|\b(conta|boleto|fatura|parcela|prestacao|mensalidade)s?\b.*\b(paguei|quitei)\b"
+)
+PADRAO_MARCAR_PAGO = re.compile(r"^(?:ja\s+)?(?:paguei|quitei)\s+(?:a|o|as|os)?\s*(?P<descricao>.+)$")
+
+# Palavras removidas ao montar a descrição: verbos e moedas em qualquer posição,
+# preposições/artigos só nas pontas ("no açaí" -> "açaí", mas "conta de luz" fica intacta)
+PADRAO_VERBOS = re.compile(
+    r"(gastei|paguei|quitei|comprei|gasto|torrei|despesa|recebi|ganhei|entrou|caiu|vence|vencimento|vencendo"
+    r"|reais|real|conto|pila|r\$|ja)"
+)
+PADRAO_LIGACAO = re.compile(r"(de|do|da|dos|das|no|na|nos|nas|em|com|o|a|os|as|um|uma|pra|pro|pras|pros|para|por)")
+
+CATEGORIAS = [
+    ("Alimentação", re.compile(r"\b(acai|mercado|supermercado|restaurante|lanche|ifood|padaria|almoco|jantar|pizza|comida|cafe|feira)s?\b")),
+    ("Transporte", re.compile(r"\b(uber|gasolina|combustivel|onibus|metro|passagem|estacionamento|taxi)s?\b")),
+    ("Contas", re.compile(r"\b(luz|energia|agua|internet|aluguel|gas|telefone|celular|condominio|boleto|fatura|cartao)s?\b")),
+    ("Saúde", re.compile(r"\b(farmacia|remedio|medico|consulta|dentista|plano de saude)s?\b")),
+    ("Lazer", re.compile(r"\b(cinema|show|bar|viagem|netflix|spotify|jogo)s?\b")),
+    ("Educação", re.compile(r"\b(escola|faculdade|curso|livro|mensalidade)s?\b")),
+    ("Salário", re.compile(r"\b(salario|freela|pagamento|renda)s?\b")),
+]
+
+
+def converter_valor(numero):
+    """Converte um número no formato brasileiro (ou com ponto decimal) em float."""
+    if "," in numero:
+        return float(numero.replace(".", "").replace(",", "."))
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", numero):
+        return float(numero.replace(".", ""))
+    return float(numero)
+
+
+def extrair_data(texto, hoje, futura=True):
+    """
+    Retorna (data, trecho) da primeira data reconhecida no texto normalizado, ou (None, None).
+    Datas sem mês ou sem ano ("dia 10", "10/10") são a próxima ocorrência se `futura` (vencimentos)
+    ou a última até hoje, caso contrário (gastos e receitas já feitos).
+    """
+    match = PADRAO_DATA.search(texto)
+    if not match:
+        return None, None
+    if match.group("depois_amanha"):
+        return hoje + timedelta(days=2), match.group(0)
+    if match.group("amanha"):
+        return hoje + timedelta(days=1), match.group(0)
+    if match.group("hoje"):
+        return hoje, match.group(0)
+    if match.group("ontem"):
+        return hoje - timedelta(days=1), match.group(0)
+    try:
+        if match.group("dia"):
+            # "dia 25": neste mês, ou no próximo (no anterior, se não `futura`) do lado errado de hoje
+            dia = int(match.group("dia"))
+            alvo = hoje.replace(day=dia)
+            if futura and alvo < hoje:
+                proximo = (hoje.replace(day=1) + timedelta(days=32)).replace(day=1)
+                alvo = proximo.replace(day=dia)
+            elif not futura and alvo > hoje:
+                anterior = hoje.replace(day=1) - timedelta(days=1)
+                alvo = anterior.replace(day=dia)
+            return alvo, match.group(0)
+        ano = match.group("ano")
+        ano = hoje.year if ano is None else int(ano) + (2000 if len(ano) == 2 else 0)
+        alvo = date(ano, int(match.group("mes")), int(match.group("dia_mes")))
+        if match.group("ano") is None:
+            if futura and alvo < hoje:
+                alvo = alvo.replace(year=ano + 1)
+            elif not futura and alvo > hoje:
+                alvo = alvo.replace(year=ano - 1)
+        return alvo, match.group(0)
+    except ValueError:
+        # Dia inexistente no mês (ex.: "dia 31" em novembro)
+        return None, None
+
+
+def _descricao(mensagem_usuario, trechos):
+    """Monta a descrição removendo os trechos (valor, data) e as palavras de ruído."""
+    texto = mensagem_usuario.strip().lower()
+    normalizado = normalizar(mensagem_usuario)
+    # Os trechos vêm do texto normalizado; se a normalização mudou o comprimento
+    # (ex.: emoji composto), usa o texto normalizado, sem acentos
+    if len(normalizado) != len(texto):
+        texto = normalizado
+    for inicio, fim in sorted(trechos, reverse=True):
+        texto = texto[:inicio] + " " + texto[fim:]
+        normalizado = normalizado[:inicio] + " " + normalizado[fim:]
+
+    palavras = [
+        (original, norm) for original, norm in zip(texto.split(), normalizado.split())
+        if not PADRAO_VERBOS.fullmatch(norm) and any(c.isalnum() for c in norm)
+    ]
+    while palavras and PADRAO_LIGACAO.fullmatch(palavras[0][1]):
+        palavras.pop(0)
+    while palavras and PADRAO_LIGACAO.fullmatch(palavras[-1][1]):
+        palavras.pop()
+    return " ".join(original for original, _ in palavras).strip(" .,!?") or None
+
+
+def _categoria(texto):
+    for categoria, padrao in CATEGORIAS:
+        if padrao.search(texto):
+            return categoria
+    return "Outros"
+
+
+def extrair_transacao(mensagem_usuario, hoje=None):
+    """
+    Extrai, com regras determinísticas, os dados das frases de transação mais comuns.
+    Retorna um dict no mesmo formato de interpretar_mensagem_gemini, ou None quando a
+    mensagem não se encaixa com segurança em nenhuma regra (e deve ir para o Gemini).
+    """
+    hoje = hoje or date.today()
+    texto = normalizar(mensagem_usuario)
+    if PADRAO_PERGUNTA.search(texto) or PADRAO_NEGACAO.search(texto) or PADRAO_EDICAO.search(texto):
+        return None
+
+    # "paguei a conta de luz": baixa de dívida, sem valor
+    pago = PADRAO_MARCAR_PAGO.match(texto)
+    if pago and not PADRAO_VALOR.search(texto):
+        return {
+            "intencao": "marcar_pago", "valor": None, "categoria": None,
+            "descricao": _descricao(mensagem_usuario, [(0, pago.start("descricao"))]),
+            "data": str(hoje), "data_vencimento": None, "status": None,
+        }
+
+    # Com valor, "paguei" + conta é ambíguo; sem valor, já foi tratado como baixa acima
+    if PADRAO_PAGAMENTO_DE_CONTA.search(texto):
+        return None
+
+    intencao = next((nome for nome, padrao in REGRAS_INTENCAO if padrao.search(texto)), None)
+    if intencao is None:
+        return None
+    divida = intencao == "registrar_divida"
+
+    # Vencimentos estão no futuro; gastos e receitas, no passado
+    data_informada, trecho_data = extrair_data(texto, hoje, futura=divida)
+    trechos = []
+    if trecho_data:
+        inicio = texto.index(trecho_data)
+        trechos.append((inicio, inicio + len(trecho_data)))
+
+    # Valor: números fora do trecho de data; com "R$"/"reais" têm prioridade.
+    # Vários números sem moeda ("comprei 2 pizzas por 90") são ambíguos e vão para o Gemini.
+    candidatos = [
+        match for match in PADRAO_VALOR.finditer(texto)
+        if not any(inicio <= match.start() < fim for inicio, fim in trechos)
+    ]
+    com_moeda = [m for m in candidatos if m.group("com_simbolo") or m.group(0) != m.group("numero")]
+    if com_moeda:
+        escolhido = com_moeda[0]
+    elif len(candidatos) == 1:
+        escolhido = candidatos[0]
+    else:
+        return None
+    if PADRAO_MAGNITUDE.match(texto, escolhido.end()):
+        return None
+    if escolhido not in com_moeda:
+        seguinte = PADRAO_QUANTIDADE.match(texto, escolhido.end())
+        if seguinte and not PADRAO_LIGACAO.fullmatch(seguinte.group("palavra")):
+            return None
+    valor = converter_valor(escolhido.group("com_simbolo") or escolhido.group("numero"))
+    trechos.append(escolhido.span())
+
+    if divida and data_informada is None:
+        return None
+
+    descricao = _descricao(mensagem_usuario, trechos)
+    if not descricao or PADRAO_CONSULTA.search(normalizar(descricao)):
+        return None
+
+    return {
+        "intencao": intencao,
+        "valor": valor,
+        "categoria": _categoria(normalizar(descricao)),
+        "descricao": descricao,
+        # Para dívidas, a data informada é o vencimento; para gastos e receitas, a data da transação
+        "data": str(hoje if divida or data_informada is None else data_informada),
+        "data_vencimento": str(data_informada) if divida else None,
+        "status": "pendente" if divida else "pago",
+    }
@@ -0,0 +1,64 @@
+import queue
+import threading
+import zlib
+
+_SENTINELA = object()
+
+
+class FilaMensagens:
+    """
+    Pool de workers para processar mensagens fora da requisição HTTP.
+    Cada usuário é sempre roteado para o mesmo worker, garantindo que suas
+    mensagens sejam tratadas em sequência. As filas são limitadas (backpressure).
+    """
+
+    def __init__(self, processador, num_workers=4, capacidade=1000):
+        self.processador = processador
+        self.filas = [queue.Queue(maxsize=capacidade) for _ in range(num_workers)]
+        self.threads = []
+        self.encerrando = False
+        for i, fila in enumerate(self.filas):
+            t = threading.Thread(target=self._executar, args=(fila,), name=f"worker-mensagens-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def _fila_do_usuario(self, user_id):
+        # crc32 é estável entre processos, ao contrário de hash() com PYTHONHASHSEED
+        return self.filas[zlib.crc32(user_id.encode()) % len(self.filas)]
+
+    def enfileirar(self, user_id, *args, timeout=0.5):
+        """Coloca a tarefa na fila do usuário. Retorna False se a fila estiver cheia ou encerrando."""
+        if self.encerrando:
+            return False
+        try:
+            self._fila_do_usuario(user_id).put((user_id, args), timeout=timeout)
+            return True
+        except queue.Full:
+            print(f"Fila cheia, mensagem de {user_id} recusada.")
+            return False
+
+    def tamanho(self):
+        return sum(f.qsize() for f in self.filas)
+
+    def _executar(self, fila):
+        while True:
+            item = fila.get()
+            try:
+                if item is _SENTINELA:
+                    return
+                user_id, args = item
+                self.processador(user_id, *args)
+            except Exception as e:
+                print(f"Erro no worker de mensagens: {e}")
+            finally:
+                fila.task_done()
+
+    def encerrar(self, timeout=30):
+        """Para de aceitar mensagens e aguarda o processamento do que já está na fila."""
+        if self.encerrando:
+            return
+        self.encerrando = True
+        for fila in self.filas:
+            fila.put(_SENTINELA)
+        for t in self.threads:
+            t.join(timeout)
@@ -2,14 +2,35 @@ import google.generativeai as genai
 import os
 import re
 import json
+import time
 from datetime import date, timedelta
 
+from cache import CacheInterpretacao
+from metricas import contador, histograma
+
 # Configuração da API Key do Gemini
 # Lembre-se de configurar a variável de ambiente GOOGLE_API_KEY no Render
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+# Endpoint alternativo (ex.: benchmarks/fake_gemini.py); exige o transporte REST
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+if GEMINI_API_ENDPOINT:
+    genai.configure(api_key=GOOGLE_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+else:
+    genai.configure(api_key=GOOGLE_API_KEY)
 model = genai.GenerativeModel('gemini-1.5-flash-latest')
 
+# Cache das interpretações: mensagens iguais (após normalização) no mesmo dia não chamam o Gemini de novo
+cache_interpretacao = CacheInterpretacao(
+    max_itens=int(os.getenv("GEMINI_CACHE_MAX_ITENS", "5000")),
+    ttl=int(os.getenv("GEMINI_CACHE_TTL", str(6 * 3600))),
+    persistente=os.getenv("GEMINI_CACHE_PERSISTENTE", "0") == "1",
+)
+
+# Latência de cada generate_content e respostas que não trouxeram o JSON esperado
+LLM_SEGUNDOS = histograma("financeiro_llm_segundos", "Duração das chamadas ao Gemini", buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30))
+FALHAS_JSON = contador("financeiro_extrair_json_falhas_total", "Respostas do Gemini sem JSON utilizável")
+ERROS = contador("financeiro_erros_total", "Erros por etapa")
+
 def extrair_json(texto):
     """Extrai um objeto JSON de uma string, mesmo que esteja dentro de blocos de código Markdown."""
     match = re.search(r'\{.*\}', texto, re.DOTALL)
@@ -18,19 +39,33 @@ def extrair_json(texto):
         try:
             return json.loads(json_str)
         except json.JSONDecodeError:
+            FALHAS_JSON.inc(formato="objeto", motivo="invalido")
             print(f"Erro ao decodificar o JSON extraído: {json_str}")
             return None
+    FALHAS_JSON.inc(formato="objeto", motivo="ausente")
     return None
 
-def interpretar_mensagem_gemini(mensagem_usuario):
-    """
-    Usa a IA Gemini para interpretar a mensagem do usuário e extrair informações financeiras estruturadas.
-    Agora entende uma gama muito maior de intenções e entidades.
-    """
+def extrair_json_lista(texto):
+    """Extrai um array JSON de uma string, mesmo que esteja dentro de blocos de código Markdown."""
+    match = re.search(r'\[.*\]', texto, re.DOTALL)
+    if match:
+        json_str = match.group(0)
+        try:
+            dados = json.loads(json_str)
+            return dados if isinstance(dados, list) else None
+        except json.JSONDecodeError:
+            FALHAS_JSON.inc(formato="lista", motivo="invalido")
+            print(f"Erro ao decodificar o array JSON extraído: {json_str}")
+            return None
+    FALHAS_JSON.inc(formato="lista", motivo="ausente")
+    return None
+
+def montar_instrucoes():
+    """Monta as instruções comuns aos prompts de mensagem única e em lote."""
     hoje = date.today()
     amanha = hoje + timedelta(days=1)
 
-    prompt = f"""
+    return f"""
     Você é um assistente financeiro especialista. Sua tarefa é analisar a mensagem do usuário e extrair os dados em um formato JSON.
 
     O JSON deve ter a seguinte estrutura:
@@ -52,6 +87,8 @@ def interpretar_mensagem_gemini(mensagem_usuario):
     - 'consultar_saldo': O usuário quer saber o balanço. Ex: "qual meu saldo?".
     - 'consultar_dividas': O usuário quer ver as contas pendentes. Ex: "quais contas eu tenho?".
     - 'verificar_vencimentos': O usuário pede para verificar contas próximas do vencimento. Ex: "verificar contas a vencer".
+    - 'consultar_orcamento': O usuário pede o resumo/relatório de gastos do mês ou do orçamento. Ex: "resumo do mês", "relatório de gastos". Se citar um mês, coloque-o em 'data' (formato AAAA-MM-01).
+    - 'definir_orcamento': O usuário define um limite mensal de gastos para uma categoria. Ex: "orçamento de 500 para alimentação". 'valor' é o limite e 'categoria' a categoria.
     - 'saudacao': Uma saudação simples. Ex: "oi", "bom dia".
     - 'ajuda': O usuário pede ajuda.
     - 'desconhecido': Se não conseguir identificar a intenção.
@@ -63,22 +100,89 @@ def interpretar_mensagem_gemini(mensagem_usuario):
     4. Para a intenção 'marcar_pago', a 'descricao' é a chave. Tente extrair o que foi pago (ex: "conta de luz").
     5. Se for uma saudação ou consulta, os outros campos podem ser nulos.
 
+"""
+
+def interpretar_mensagem_gemini(mensagem_usuario):
+    """
+    Usa a IA Gemini para interpretar a mensagem do usuário e extrair informações financeiras estruturadas.
+    Agora entende uma gama muito maior de intenções e entidades.
+    """
+    em_cache = cache_interpretacao.get(mensagem_usuario)
+    if em_cache is not None:
+        print("Interpretação encontrada no cache:", em_cache)
+        return em_cache
+    return _interpretar_gemini(mensagem_usuario)
+
+def _interpretar_gemini(mensagem_usuario):
+    prompt = montar_instrucoes() + f"""
     Analise a mensagem a seguir:
     "{mensagem_usuario}"
     """
     try:
         print("Enviando prompt para a IA...")
-        response = model.generate_content(prompt)
+        inicio = time.perf_counter()
+        with LLM_SEGUNDOS.cronometrar(modo="unica"):
+            response = model.generate_content(prompt)
         print("Resposta bruta da IA:", response.text)
         
         dados_json = extrair_json(response.text)
         if dados_json:
             print("JSON extraído com sucesso:", dados_json)
+            cache_interpretacao.set(mensagem_usuario, dados_json, time.perf_counter() - inicio)
             return dados_json
         else:
             print("Não foi possível extrair JSON da resposta.")
             return None
     except Exception as e:
+        ERROS.inc(etapa="llm")
         print(f"Erro ao chamar a API do Gemini: {e}")
         return None
 
+def interpretar_mensagens_gemini(mensagens):
+    """
+    Interpreta várias mensagens em uma única chamada ao Gemini.
+    Retorna uma lista com um resultado (dict ou None) por mensagem, na mesma ordem.
+    Só as mensagens ausentes do cache são enviadas.
+    """
+    resultados = [cache_interpretacao.get(m) for m in mensagens]
+    faltantes = [i for i, dados in enumerate(resultados) if dados is None]
+    if len(faltantes) <= 1:
+        for i in faltantes:
+            resultados[i] = _interpretar_gemini(mensagens[i])
+        return resultados
+
+    interpretados = _interpretar_lote_gemini([mensagens[i] for i in faltantes])
+    for i, dados in zip(faltantes, interpretados):
+        resultados[i] = dados
+    return resultados
+
+def _interpretar_lote_gemini(mensagens):
+    lista = "\n".join(f'    {i}. "{m}"' for i, m in enumerate(mensagens, 1))
+    prompt = montar_instrucoes() + f"""
+    Analise as {len(mensagens)} mensagens a seguir, uma de cada vez.
+    Responda com um array JSON contendo exatamente {len(mensagens)} objetos, um por mensagem, na mesma ordem:
+{lista}
+    """
+    try:
+        print(f"Enviando prompt em lote ({len(mensagens)} mensagens) para a IA...")
+        inicio = time.perf_counter()
+        with LLM_SEGUNDOS.cronometrar(modo="lote"):
+            response = model.generate_content(prompt)
+        print("Resposta bruta da IA:", response.text)
+
+        dados_lista = extrair_json_lista(response.text)
+        if dados_lista is None or len(dados_lista) != len(mensagens):
+            # Resposta incompleta: interpreta uma a uma para não perder mensagens
+            print("Array JSON ausente ou com tamanho diferente; interpretando individualmente.")
+            return [_interpretar_gemini(m) for m in mensagens]
+
+        latencia = (time.perf_counter() - inicio) / len(mensagens)
+        resultados = [d if isinstance(d, dict) else None for d in dados_lista]
+        for mensagem, dados in zip(mensagens, resultados):
+            if dados:
+                cache_interpretacao.set(mensagem, dados, latencia)
+        return resultados
+    except Exception as e:
+        ERROS.inc(etapa="llm")
+        print(f"Erro ao chamar a API do Gemini: {e}")
+        return [None] * len(mensagens)
@@ -1,102 +1,227 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-import pickle
+"""
+Treino do classificador de intenções usado por intent_utils (modelo_intencoes.ModeloIntencoes).
 
-data = []
+Os exemplos chegam em fluxo, sem montar o conjunto inteiro em memória: frases/<intencao>.txt,
+as variações geradas a partir das listas abaixo e as mensagens rotuladas em produção
+(JSONL gravado por intent_utils.registrar_exemplo). O treino é incremental, com
+SGDClassifier.partial_fit sobre features por hashing, e o resultado é exportado em um .npz
+com os pesos esparsos, que carrega em milissegundos e prediz sem sklearn.
+
+Parte das frases-base (com todas as suas variações) fica de fora para medir a acurácia;
+depois o modelo é treinado de novo com tudo e exportado.
+
+Uso: python intent_model.py [--rotuladas intencoes_rotuladas.jsonl] [--epocas 8] [--saida intent_model.npz]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import time
+import zlib
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import SGDClassifier
+
+from modelo_intencoes import BITS_HASH, ModeloIntencoes, featurizar
+from texto_utils import normalizar
+
+CONFIANCA_MINIMA = float(os.getenv("INTENT_CONFIANCA_MINIMA", "0.85"))
 
 # -- Gerador automático de frases para turbinar as intenções --
 
-# Greetings
-greetings_frases = [
+FRASES = {
+    "greetings": [
     "oi", "olá", "ola", "opa", "e aí", "eae", "yo", "fala ai", "fala", "salve", "alô", "alow", "hey", "hi", "hello", "bom dia", "boa tarde", "boa noite", "menu", "comandos", "funcoes", "me ajuda", "ajuda", "ajuda por favor", "socorro", "preciso de ajuda", "me salva", "tudo bem", "tudo certo", "como vai", "tranquilo", "beleza", "blz", "suave", "sup", "fala comigo", "start", "iniciar", "inicio", "vamos la", "começar", "ajudaaa", "ajudaaa!", "me socorre", "alguém aí?", "tem alguém aí?", "tem alguem", "está ai?", "vc está ai?", "vc ta ai?", "você está ai?", "você ta ai?", "olá bot", "ei bot", "oi bot", "fala bot", "olá ia", "assistente financeira", "e aí, beleza?", "fala zap", "fala chat", "oi zap", "opa assistente", "alô bot", "alow bot", "fala zapbot", "olá zapbot", "yo bot", "fala ai bot", "tudo bem bot", "tudo certo bot", "beleza bot", "blz bot", "suave bot", "fala zap", "fala ia", "oi assistente", "olá assistente", "bom dia bot", "boa tarde bot", "boa noite bot"
-]
-# Multiplica por variações
-for frase in greetings_frases:
-    data.append((frase, "greetings"))
-    data.append((frase + " tudo bem?", "greetings"))
-    data.append(("oi " + frase, "greetings"))
-    data.append((frase + " 👋", "greetings"))
-    data.append((frase + " 😃", "greetings"))
-    data.append(("👋 " + frase, "greetings"))
-    data.append(("fala " + frase, "greetings"))
-    data.append(("menu " + frase, "greetings"))
-    data.append(("comandos " + frase, "greetings"))
-
-# Dividas
-dividas_frases = [
+    ],
+    "dividas": [
     "minhas dívidas", "minhas dividas", "ver dívidas", "ver dividas", "quais as minhas dívidas", "quais as minhas dividas", "tenho dívidas?", "tenho dividas?", "contas a pagar", "contas pra pagar", "contas pendentes", "contas atrasadas", "me mostra as dívidas", "me mostra as dividas", "dívidas atuais", "dividas atuais", "quais contas estão abertas?", "quais contas tão abertas?", "meus débitos", "meus debitos", "débitos", "debitos", "lista de dívidas", "lista de dividas", "dívida atrasada", "divida atrasada", "dívida vencida", "divida vencida", "dividas pendentes", "dívidas pendentes", "o que devo?", "o que eu devo?", "tô devendo?", "to devendo?", "tem dívida?", "tem divida?", "tem contas pra eu pagar?", "tem boleto?", "ver boleto", "meus boletos", "ver boletos", "contas vencidas", "contas vencidas já", "alguma dívida", "alguma divida", "dividas por favor", "dívidas por favor", "relatório de dívidas", "relatório de dividas", "relatorio de dívidas", "relatorio de dividas", "relatorio de contas", "relatório de contas", "quais contas estão pendentes", "quais contas faltam", "tem boleto vencido?", "tem algo pra vencer?", "devo algo?", "contas vencendo", "devo pra alguém?", "devo pra alguém", "tenho dívida?", "tenho divida?", "lista de pendências", "lista de pendencias", "pendências financeiras", "pendencias financeiras", "quais pendências", "quais pendencias", "me mostra pendencias", "me mostra pendências", "pendencia", "pendência"
-]
-for frase in dividas_frases:
-    data.append((frase, "dividas"))
-    data.append(("quero " + frase, "dividas"))
-    data.append(("ver " + frase, "dividas"))
-    data.append(("me diz " + frase, "dividas"))
-    data.append(("me fala " + frase, "dividas"))
-    data.append((frase + " por favor", "dividas"))
-    data.append(("tem " + frase + "?", "dividas"))
-    data.append(("tenho " + frase + "?", "dividas"))
-    data.append(("mostra " + frase, "dividas"))
-    data.append((frase + " 👀", "dividas"))
-    data.append(("ver minhas " + frase, "dividas"))
-
-# Saldo
-saldo_frases = [
+    ],
+    "saldo": [
     "qual o meu saldo", "meu saldo", "quanto dinheiro eu tenho", "saldo atual", "quanto sobrou", "quanto tenho", "saldo", "ver saldo", "quanto ainda tenho", "quanto tenho de grana", "money atual", "grana atual", "quanto tem na conta", "quantos reais eu tenho", "saldo por favor", "saldo agora", "saldo bancário", "saldo disponível", "quero ver meu saldo", "quanto resta", "quanto resta na conta", "quanto dinheiro resta", "quanto tenho sobrando", "quanto tenho pra gastar", "quanto tenho disponível", "saldo na conta", "quanto tenho de saldo", "saldo da conta", "me diz meu saldo", "mostra o saldo", "saldo total", "saldo final", "saldo zap", "saldo bot", "saldo ai"
-]
-for frase in saldo_frases:
-    data.append((frase, "saldo"))
-    data.append((frase + "?", "saldo"))
-    data.append(("me mostra " + frase, "saldo"))
-    data.append(("quero saber " + frase, "saldo"))
-    data.append(("saldo " + frase, "saldo"))
-    data.append(("quanto tenho " + frase, "saldo"))
-    data.append(("disponível " + frase, "saldo"))
-    data.append(("tenho " + frase, "saldo"))
-
-# Dica
-dica_frases = [
+    ],
+    "dica": [
     "me dá uma dica financeira", "conselho de finanças", "dica para economizar", "dica de grana", "alguma dica de dinheiro", "dica de economia", "me dá uma dica", "quero dica financeira", "me aconselha", "me dá um conselho financeiro", "tem alguma dica de finanças?", "dica do dia", "manda uma dica", "me ensina a economizar", "dica pra guardar dinheiro", "dica pra juntar grana", "dica pra investir", "dica de investimento", "dica", "me ajuda a economizar", "tem alguma dica?", "tip financeiro", "dica de poupar", "me ensina a poupar", "dica de poupança", "me diz uma dica", "conselho pra economizar", "conselho do dia", "me fala uma dica", "me fala uma dica financeira", "alguma dica", "conselho?", "me aconselha ai", "algum conselho", "me da uma dica ai", "dica financeira ai", "tip do dia", "tip zap", "tip bot", "dica bot", "dica ai", "dica zap"
-]
-for frase in dica_frases:
-    data.append((frase, "dica"))
-    data.append(("tem " + frase + "?", "dica"))
-    data.append(("me manda " + frase, "dica"))
-    data.append(("quero " + frase, "dica"))
-    data.append(("qual " + frase, "dica"))
-    data.append(("dica " + frase, "dica"))
-    data.append((frase + " por favor", "dica"))
-    data.append((frase + " 🙏", "dica"))
-    data.append((frase + " 😁", "dica"))
-    data.append(("manda uma " + frase, "dica"))
-
-# Orçamento
-orcamento_frases = [
+    ],
+    "orcamento": [
     "meu orçamento", "ver orçamento", "relatório de orçamento", "orcamento mensal", "qual meu budget", "como está meu orçamento", "orcamento", "me mostra o orçamento", "mostra orçamento", "orcamento atual", "quero ver meu orçamento", "meu budget", "como está o budget", "ver meu orçamento", "relatório do orçamento", "budget", "status do orçamento", "me diz o orçamento", "plano financeiro", "meu plano financeiro", "ver plano financeiro", "mostra meu orçamento", "orçamento detalhado", "orçamento resumido", "resumo do orçamento", "meu orçamento atual", "relatorio financeiro", "financeiro", "relatorio mensal", "resumo financeiro", "relatorio do mês", "relatorio de gastos", "resumo do mês"
-]
-for frase in orcamento_frases:
-    data.append((frase, "orcamento"))
-    data.append(("ver " + frase, "orcamento"))
-    data.append(("me mostra " + frase, "orcamento"))
-    data.append(("mostra " + frase, "orcamento"))
-    data.append((frase + " por favor", "orcamento"))
-    data.append((frase + " do mês", "orcamento"))
-    data.append((frase + " desse mês", "orcamento"))
-    data.append((frase + " atual", "orcamento"))
-    data.append(("quero saber " + frase, "orcamento"))
-    data.append(("quero " + frase, "orcamento"))
-
-# Você pode adicionar outros tipos de intenção aqui...
-
-df = pd.DataFrame(data, columns=["frase", "intencao"])
-
-vectorizer = TfidfVectorizer()
-X = vectorizer.fit_transform(df.frase)
-y = df.intencao
-
-clf = LogisticRegression(max_iter=1500)
-clf.fit(X, y)
-
-# Salva modelo e vetor em disco
-pickle.dump(clf, open("intent_clf.pkl", "wb"))
-pickle.dump(vectorizer, open("intent_vectorizer.pkl", "wb"))
\ No newline at end of file
+    ],
+}
+
+# Variações aplicadas a cada frase ("{}" é a frase original)
+VARIACOES = {
+    "greetings": ["{}", "{} tudo bem?", "oi {}", "{} 👋", "{} 😃", "👋 {}", "fala {}", "menu {}", "comandos {}"],
+    "dividas": ["{}", "quero {}", "ver {}", "me diz {}", "me fala {}", "{} por favor", "tem {}?", "tenho {}?", "mostra {}", "{} 👀", "ver minhas {}"],
+    "saldo": ["{}", "{}?", "me mostra {}", "quero saber {}", "saldo {}", "quanto tenho {}", "disponível {}", "tenho {}"],
+    "dica": ["{}", "tem {}?", "me manda {}", "quero {}", "qual {}", "dica {}", "{} por favor", "{} 🙏", "{} 😁", "manda uma {}"],
+    "orcamento": ["{}", "ver {}", "me mostra {}", "mostra {}", "{} por favor", "{} do mês", "{} desse mês", "{} atual", "quero saber {}", "quero {}"],
+}
+
+
+def exemplos_gerados():
+    """(texto, intenção, frase-base) de cada variação das listas acima."""
+    for intencao, frases in FRASES.items():
+        for frase in frases:
+            for modelo in VARIACOES[intencao]:
+                yield modelo.format(frase), intencao, frase
+
+
+def exemplos_arquivos(pasta="frases"):
+    """Uma frase por linha em frases/<intencao>.txt."""
+    for caminho in sorted(glob.glob(os.path.join(pasta, "*.txt"))):
+        intencao = os.path.splitext(os.path.basename(caminho))[0]
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    yield linha.strip(), intencao, linha.strip()
+
+
+def exemplos_rotulados(caminho):
+    """Mensagens de produção no formato {"texto": ..., "intencao": ...}, uma por linha."""
+    if not caminho or not os.path.exists(caminho):
+        return
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            if registro.get("texto") and registro.get("intencao"):
+                yield registro["texto"], registro["intencao"], registro["texto"]
+
+
+def embaralhar(exemplos, tamanho, rnd):
+    """Embaralha o fluxo com um buffer de `tamanho` exemplos (as fontes vêm agrupadas por intenção)."""
+    buffer = []
+    for exemplo in exemplos:
+        if len(buffer) < tamanho:
+            buffer.append(exemplo)
+            continue
+        i = rnd.randrange(tamanho)
+        yield buffer[i]
+        buffer[i] = exemplo
+    rnd.shuffle(buffer)
+    yield from buffer
+
+
+def em_lotes(exemplos, tamanho):
+    lote = []
+    for exemplo in exemplos:
+        lote.append(exemplo)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def matriz(textos):
+    indptr, indices, valores = featurizar(textos)
+    return csr_matrix((valores, indices, indptr), shape=(len(textos), 1 << BITS_HASH))
+
+
+def na_validacao(frase_base, percentual):
+    # Pela frase-base normalizada: variações e grafias da mesma frase ficam do mesmo lado
+    return zlib.crc32(normalizar(frase_base).encode()) % 100 < percentual
+
+
+def treinar(fontes, classes, epocas, tamanho_lote, buffer, semente, filtro=lambda exemplo: True):
+    """Passa `epocas` vezes pelo fluxo de `fontes()` (chamada a cada época), lote a lote."""
+    clf = SGDClassifier(loss="log_loss", alpha=1e-5, random_state=semente)
+    rnd = random.Random(semente)
+    vistos = 0
+    for _ in range(epocas):
+        exemplos = (e for e in fontes() if e[1] in classes and filtro(e))
+        for lote in em_lotes(embaralhar(exemplos, buffer, rnd), tamanho_lote):
+            textos, rotulos, _ = zip(*lote)
+            clf.partial_fit(matriz(textos), rotulos, classes=classes)
+            vistos += len(lote)
+    return ModeloIntencoes.de_coeficientes(clf.classes_, clf.coef_, clf.intercept_), vistos
+
+
+def avaliar(modelo, exemplos, tamanho_lote):
+    """Acurácia no conjunto de validação, e cobertura/acurácia acima de CONFIANCA_MINIMA."""
+    total = acertos = confiantes = acertos_confiantes = 0
+    for lote in em_lotes(exemplos, tamanho_lote):
+        textos, rotulos, _ = zip(*lote)
+        proba = modelo.predict_proba(textos)
+        previstos = modelo.classes_[proba.argmax(axis=1)]
+        certos = previstos == np.asarray(rotulos)
+        seguros = proba.max(axis=1) >= CONFIANCA_MINIMA
+        total += len(lote)
+        acertos += int(certos.sum())
+        confiantes += int(seguros.sum())
+        acertos_confiantes += int((certos & seguros).sum())
+    return {
+        "exemplos": total,
+        "acuracia": acertos / total if total else None,
+        "cobertura_confiante": confiantes / total if total else None,
+        "acuracia_confiante": acertos_confiantes / confiantes if confiantes else None,
+    }
+
+
+def medir_inferencia(caminho, textos, repeticoes=20):
+    inicio = time.perf_counter()
+    modelo = ModeloIntencoes.carregar(caminho)
+    carga = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        modelo.predict_proba(textos)
+    lote = (time.perf_counter() - inicio) / repeticoes
+    inicio = time.perf_counter()
+    for texto in textos[:200]:
+        modelo.predict_proba([texto])
+    unitaria = (time.perf_counter() - inicio) / min(len(textos), 200)
+    return carga, lote, unitaria
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frases", default="frases")
+    parser.add_argument("--rotuladas", default=os.getenv("INTENT_LOG_PATH", "intencoes_rotuladas.jsonl"))
+    parser.add_argument("--saida", default=os.getenv("INTENT_MODEL_PATH", "intent_model.npz"))
+    parser.add_argument("--epocas", type=int, default=8)
+    parser.add_argument("--lote", type=int, default=1024)
+    parser.add_argument("--buffer", type=int, default=20000, help="tamanho do buffer de embaralhamento")
+    parser.add_argument("--validacao", type=int, default=20, help="% das frases-base separadas para validação")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    def fontes():
+        yield from exemplos_arquivos(args.frases)
+        yield from exemplos_gerados()
+        yield from exemplos_rotulados(args.rotuladas)
+
+    classes = sorted(set(FRASES) | {os.path.splitext(os.path.basename(c))[0]
+                                    for c in glob.glob(os.path.join(args.frases, "*.txt"))})
+    ignorados = sum(1 for _, intencao, _ in exemplos_rotulados(args.rotuladas) if intencao not in classes)
+    if ignorados:
+        print(f"{ignorados} mensagens rotuladas com intenções fora de {classes} foram ignoradas.")
+
+    if args.validacao:
+        inicio = time.perf_counter()
+        modelo, vistos = treinar(fontes, classes, args.epocas, args.lote, args.buffer, args.semente,
+                                 filtro=lambda e: not na_validacao(e[2], args.validacao))
+        print(f"Treino (sem a validação): {vistos} exemplos vistos em {args.epocas} épocas, "
+              f"{time.perf_counter() - inicio:.1f}s")
+        validacao = (e for e in fontes() if e[1] in classes and na_validacao(e[2], args.validacao))
+        r = avaliar(modelo, validacao, args.lote)
+        print(f"Validação ({r['exemplos']} exemplos de frases-base nunca vistas): acurácia {r['acuracia']:.1%} | "
+              f"confiança >= {CONFIANCA_MINIMA}: {r['cobertura_confiante']:.1%} das mensagens, "
+              f"acurácia {r['acuracia_confiante'] or 0:.1%}")
+
+    inicio = time.perf_counter()
+    modelo, vistos = treinar(fontes, classes, args.epocas, args.lote, args.buffer, args.semente)
+    modelo.salvar(args.saida)
+    print(f"Modelo final: {vistos} exemplos vistos, {time.perf_counter() - inicio:.1f}s | "
+          f"{len(modelo.features)} features não nulas, {os.path.getsize(args.saida) / 1024:.0f} KiB em {args.saida}")
+
+    textos = [texto for texto, _, _ in exemplos_gerados()]
+    carga, lote, unitaria = medir_inferencia(args.saida, textos)
+    print(f"Inferência: carga {carga * 1000:.1f} ms | lote de {len(textos)}: {lote * 1000:.1f} ms "
+          f"({len(textos) / lote:,.0f} msg/s) | uma mensagem: {unitaria * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import json
+import os
+import pickle
+import re
+import threading
+from datetime import date
+
+from extrator import PADRAO_EDICAO, PADRAO_NEGACAO
+from modelo_intencoes import ModeloIntencoes
+from texto_utils import normalizar
+
+# Caminhos dos artefatos gerados por intent_model.py (o .npz tem prioridade sobre os pickles antigos)
+MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "intent_model.npz")
+CLF_PATH = os.getenv("INTENT_CLF_PATH", "intent_clf.pkl")
+VECTORIZER_PATH = os.getenv("INTENT_VECTORIZER_PATH", "intent_vectorizer.pkl")
+
+# Mensagens rotuladas pelo Gemini para retreinar o modelo (desligado se vazio)
+LOG_PATH = os.getenv("INTENT_LOG_PATH", "")
+_lock_log = threading.Lock()
+
+# Confiança mínima para responder localmente sem chamar o Gemini
+CONFIANCA_MINIMA = float(os.getenv("INTENT_CONFIANCA_MINIMA", "0.85"))
+
+# Rótulos do classificador -> intenções usadas pelo webhook.
+# 'dica' ainda não tem tratamento local e segue para o Gemini.
+MAPA_INTENCOES = {
+    "saldo": "consultar_saldo",
+    "dividas": "consultar_dividas",
+    "greetings": "saudacao",
+    "orcamento": "consultar_orcamento",
+}
+# Caminho inverso, para rotular as mensagens que o Gemini interpretou
+ROTULOS_POR_INTENCAO = {intencao: rotulo for rotulo, intencao in MAPA_INTENCOES.items()}
+ROTULOS_POR_INTENCAO.update({"ajuda": "greetings", "verificar_vencimentos": "dividas"})
+
+# Mensagens com valores, datas ou verbos de transação carregam entidades
+# que só o Gemini sabe extrair.
+PADRAO_ENTIDADES = re.compile(
+    r"\d|\b(gastei|paguei|pago|recebi|comprei|ganhei|vence|vencimento)\b",
+    re.IGNORECASE,
+)
+# "orçamento de quinhentos pra mercado" define um orçamento (valor por extenso escapa do \d);
+# "orçamento de setembro"/"do mês" continua sendo consulta
+PADRAO_DEFINIR_ORCAMENTO = re.compile(
+    r"\b(definir|defina|define|colocar|coloca|botar|bota|criar|cria)\b.*\b(orcamento|limite)\b"
+    r"|\b(orcamento|limite)\s+(de|para|pra)\s+(?!(mes|este|esse|janeiro|fevereiro|marco|abril|maio|junho|julho"
+    r"|agosto|setembro|outubro|novembro|dezembro)\b)"
+)
+PADRAO_AJUDA = re.compile(r"\b(ajuda|socorro|menu|comandos|funcoes|funções)\b", re.IGNORECASE)
+PADRAO_VENCIMENTOS = re.compile(r"\b(venc\w*|a vencer|pra vencer)\b", re.IGNORECASE)
+
+# Mês citado na mensagem (texto normalizado): o relatório local usa esse mês em vez do atual,
+# e as demais intenções, que não têm mês, vão para o Gemini
+MESES = ["janeiro", "fevereiro", "marco", "abril", "maio", "junho",
+         "julho", "agosto", "setembro", "outubro", "novembro", "dezembro"]
+PADRAO_MES = re.compile(
+    rf"\b(?:(?P<nome>{'|'.join(MESES)})|(?P<passado>mes passado|mes anterior|ultimo mes))\b"
+)
+
+
+def tem_entidades(mensagem_usuario):
+    """
+    Se a mensagem carrega algo que o classificador local não responde: valores, datas, verbos de
+    transação, negações, pedidos de edição ("apaga minha dívida de luz") ou definição de orçamento.
+    """
+    if PADRAO_ENTIDADES.search(mensagem_usuario):
+        return True
+    texto = normalizar(mensagem_usuario)
+    return bool(PADRAO_NEGACAO.search(texto) or PADRAO_EDICAO.search(texto) or PADRAO_DEFINIR_ORCAMENTO.search(texto))
+
+
+def mes_mencionado(mensagem_usuario, hoje=None):
+    """
+    Primeiro dia ('AAAA-MM-01') do mês citado na mensagem, ou None. Um mês pelo nome é o
+    mais recente com esse nome (em outubro, "novembro" é o do ano passado).
+    """
+    match = PADRAO_MES.search(normalizar(mensagem_usuario))
+    if not match:
+        return None
+    hoje = hoje or date.today()
+    if match.group("passado"):
+        ano, mes = (hoje.year, hoje.month - 1) if hoje.month > 1 else (hoje.year - 1, 12)
+    else:
+        mes = MESES.index(match.group("nome")) + 1
+        ano = hoje.year if mes <= hoje.month else hoje.year - 1
+    return f"{ano:04d}-{mes:02d}-01"
+
+
+class _ModeloPickle:
+    """Adapta o par TF-IDF + LogisticRegression antigo à interface de ModeloIntencoes."""
+
+    def __init__(self, clf, vectorizer):
+        self.clf, self.vectorizer = clf, vectorizer
+        self.classes_ = clf.classes_
+
+    def predict_proba(self, mensagens):
+        return self.clf.predict_proba(self.vectorizer.transform([m.lower() for m in mensagens]))
+
+
+def carregar_modelo():
+    """
+    Carrega o classificador do disco: o .npz de intent_model.py ou, se não existir, os pickles antigos.
+    Retorna None se nenhum estiver disponível.
+    """
+    try:
+        if os.path.exists(MODEL_PATH):
+            modelo = ModeloIntencoes.carregar(MODEL_PATH)
+        else:
+            with open(CLF_PATH, "rb") as f:
+                clf = pickle.load(f)
+            with open(VECTORIZER_PATH, "rb") as f:
+                modelo = _ModeloPickle(clf, pickle.load(f))
+        print(f"Classificador de intenções carregado ({', '.join(modelo.classes_)}).")
+        return modelo
+    except Exception as e:
+        print(f"Classificador local indisponível, usando apenas o Gemini: {e}")
+        return None
+
+
+# Carregado uma única vez, na importação do módulo (inicialização do app)
+modelo = carregar_modelo()
+
+
+def classificar_intencoes_local(mensagens):
+    """
+    Classifica um lote de mensagens com uma única chamada ao modelo local.
+    Retorna, para cada mensagem, um dict no mesmo formato de interpretar_mensagem_gemini, ou None
+    se a mensagem tiver entidades ou a confiança ficar abaixo do limite. O mês citado em um
+    pedido de relatório vai em 'data'; em outras intenções, manda a mensagem para o Gemini.
+    """
+    resultados = [None] * len(mensagens)
+    candidatas = [i for i, m in enumerate(mensagens) if not tem_entidades(m)]
+    if modelo is None or not candidatas:
+        return resultados
+
+    probabilidades = modelo.predict_proba([mensagens[i] for i in candidatas])
+    for i, proba in zip(candidatas, probabilidades):
+        indice = proba.argmax()
+        rotulo, confianca = modelo.classes_[indice], proba[indice]
+        intencao = MAPA_INTENCOES.get(rotulo)
+        if intencao is None or confianca < CONFIANCA_MINIMA:
+            continue
+
+        # Refinamentos de intenções que o classificador agrupa no mesmo rótulo
+        if intencao == "saudacao" and PADRAO_AJUDA.search(mensagens[i]):
+            intencao = "ajuda"
+        elif intencao == "consultar_dividas" and PADRAO_VENCIMENTOS.search(mensagens[i]):
+            intencao = "verificar_vencimentos"
+        dados = {"intencao": intencao, "confianca": float(confianca)}
+        mes = mes_mencionado(mensagens[i])
+        if mes is not None:
+            if intencao != "consultar_orcamento":
+                continue
+            dados["data"] = mes
+        resultados[i] = dados
+    return resultados
+
+
+def registrar_exemplo(mensagem_usuario, intencao):
+    """
+    Grava em INTENT_LOG_PATH (JSONL, desligado se vazio) as mensagens sem entidades que o Gemini
+    classificou numa intenção que o modelo local conhece, para o próximo treino de intent_model.py.
+    """
+    rotulo = ROTULOS_POR_INTENCAO.get(intencao)
+    if not LOG_PATH or rotulo is None or tem_entidades(mensagem_usuario):
+        return
+    linha = json.dumps({"texto": mensagem_usuario, "intencao": rotulo}, ensure_ascii=False)
+    with _lock_log, open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(linha + "\n")
@@ -0,0 +1,54 @@
+import threading
+
+from intent_utils import classificar_intencoes_local, registrar_exemplo
+from extrator import extrair_transacao
+from gemini_utils import interpretar_mensagens_gemini
+from metricas import histograma
+
+# Tempo gasto em cada camada (por chamada: com o lote inteiro no classificador e no LLM, por mensagem nas regras)
+INTERPRETACAO_SEGUNDOS = histograma("financeiro_interpretacao_segundos", "Duração da interpretação, por camada")
+
+# Contadores de onde cada mensagem foi interpretada
+_lock = threading.Lock()
+estatisticas = {"local": 0, "regras": 0, "gemini": 0}
+
+
+def _contar(origem, quantidade=1):
+    with _lock:
+        estatisticas[origem] += quantidade
+
+
+def obter_estatisticas():
+    """Retorna uma cópia dos contadores de interpretação local, por regras e pelo Gemini."""
+    with _lock:
+        return dict(estatisticas)
+
+
+def interpretar_mensagens(mensagens):
+    """
+    Interpreta o lote em camadas: primeiro o classificador local (consultas sem entidades),
+    depois o extrator de regras (frases de transação comuns) e, por fim, o Gemini, que recebe
+    juntas, em uma única requisição, as mensagens que as camadas locais não resolvem.
+    Retorna um resultado por mensagem.
+    """
+    with INTERPRETACAO_SEGUNDOS.cronometrar(camada="local"):
+        resultados = classificar_intencoes_local(mensagens)
+    _contar("local", sum(1 for dados in resultados if dados))
+
+    for i, mensagem in enumerate(mensagens):
+        if not resultados[i]:
+            with INTERPRETACAO_SEGUNDOS.cronometrar(camada="regras"):
+                resultados[i] = extrair_transacao(mensagem)
+            if resultados[i]:
+                _contar("regras")
+
+    pendentes = [i for i, dados in enumerate(resultados) if not dados]
+    if pendentes:
+        _contar("gemini", len(pendentes))
+        with INTERPRETACAO_SEGUNDOS.cronometrar(camada="llm"):
+            interpretados = interpretar_mensagens_gemini([mensagens[i] for i in pendentes])
+        for i, dados in zip(pendentes, interpretados):
+            resultados[i] = dados
+            if dados:
+                registrar_exemplo(mensagens[i], dados.get("intencao"))
+    return resultados
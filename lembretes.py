@@ -0,0 +1,114 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import chain, groupby
+
+from db import conexoes_shards, get_db, create_tables, shard_do_usuario
+
+# Quantos dias à frente procurar vencimentos e de quanto em quanto tempo varrer
+DIAS_ANTECEDENCIA = int(os.getenv("LEMBRETES_DIAS", "3"))
+INTERVALO_HORAS = float(os.getenv("LEMBRETES_INTERVALO_HORAS", "24"))
+WORKERS_ENVIO = int(os.getenv("LEMBRETES_WORKERS", "16"))
+# Lembretes enviados são marcados em lotes, para não abrir uma transação por usuário
+TAMANHO_LOTE = 500
+
+
+def buscar_vencimentos(dias=DIAS_ANTECEDENCIA, hoje=None):
+    """
+    Uma consulta por shard, para todos os usuários dele: dívidas pendentes que vencem entre hoje
+    e hoje + `dias` e ainda não foram notificadas, ordenadas por usuário (cada usuário fica
+    inteiro em um shard). Retorna um iterador (as linhas são lidas sob demanda).
+    """
+    hoje = hoje or date.today()
+    return chain.from_iterable(conn.execute(
+        """
+        SELECT t.id, t.user_id, t.descricao, t.valor, t.data_vencimento FROM transacoes t
+        WHERE t.status = 'pendente' AND t.data_vencimento BETWEEN ? AND ?
+          AND NOT EXISTS (
+              SELECT 1 FROM lembretes_enviados l
+              WHERE l.transacao_id = t.id AND l.data_vencimento = t.data_vencimento
+          )
+        ORDER BY t.user_id, t.data_vencimento
+        """,
+        (str(hoje), str(hoje + timedelta(days=dias)))
+    ) for conn in conexoes_shards())
+
+
+def montar_lembrete(dividas):
+    resp = "⏰ Lembrete! Contas vencendo em breve:\n"
+    for _, _, desc, val, venc in dividas:
+        resp += f"\n• {desc} - R${val:.2f} (vence em {datetime.strptime(venc, '%Y-%m-%d').strftime('%d/%m')})"
+    return resp
+
+
+def marcar_enviados(dividas):
+    # Os ids das transações são de cada shard: a marcação vai para o shard do usuário
+    agora = datetime.now().isoformat(timespec='seconds')
+    por_shard = {}
+    for id_transacao, user_id, _, _, venc in dividas:
+        por_shard.setdefault(shard_do_usuario(user_id), (user_id, []))[1].append((id_transacao, venc, agora))
+    for user_id, linhas in por_shard.values():
+        conn = get_db(user_id)
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO lembretes_enviados (transacao_id, data_vencimento, enviado_em) VALUES (?, ?, ?)",
+                linhas
+            )
+
+
+def varrer(enviar, dias=DIAS_ANTECEDENCIA, hoje=None, workers=WORKERS_ENVIO):
+    """
+    Envia um lembrete por usuário com contas vencendo nos próximos `dias`.
+    `enviar(user_id, texto)` deve retornar True em caso de sucesso; só os lembretes entregues
+    são marcados, para que um reinício não notifique de novo nem perca quem falhou.
+    Retorna (usuários notificados, falhas).
+    """
+    # Lê tudo antes de enviar: o cursor não fica aberto enquanto a mesma conexão grava as marcações
+    por_usuario = [(user_id, list(dividas)) for user_id, dividas in groupby(buscar_vencimentos(dias, hoje), key=lambda r: r[1])]
+    notificados, falhas, entregues = 0, 0, []
+
+    def enviar_lembrete(item):
+        user_id, dividas = item
+        return dividas if enviar(user_id, montar_lembrete(dividas)) else None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for dividas in executor.map(enviar_lembrete, por_usuario):
+            if dividas is None:
+                falhas += 1
+                continue
+            notificados += 1
+            entregues.extend(dividas)
+            if len(entregues) >= TAMANHO_LOTE:
+                marcar_enviados(entregues)
+                entregues = []
+    if entregues:
+        marcar_enviados(entregues)
+    return notificados, falhas
+
+
+def main():
+    from whatsapp_client import ClienteWhatsApp
+
+    create_tables()
+    cliente = ClienteWhatsApp(
+        os.getenv("ACCESS_TOKEN"),
+        os.getenv("PHONE_NUMBER_ID"),
+        mensagens_por_segundo=float(os.getenv("WHATSAPP_MSGS_POR_SEGUNDO", "80")),
+        num_workers=WORKERS_ENVIO,
+    )
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+
+    while not parar.is_set():
+        inicio = time.monotonic()
+        notificados, falhas = varrer(cliente.enviar)
+        print(f"Lembretes: {notificados} usuário(s) notificado(s), {falhas} falha(s) em {time.monotonic() - inicio:.1f}s")
+        parar.wait(INTERVALO_HORAS * 3600)
+    cliente.encerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Métricas em memória (contadores, histogramas e medidores) no formato texto do Prometheus,
+expostas pela rota /metrics do app, e um amostrador de pilhas opcional para seções lentas.
+
+Os valores são por processo: com vários workers do gunicorn, cada um responde pelos seus.
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Limites (em segundos) dos buckets: de 1 ms (consultas ao SQLite) a 10 s (Gemini com novas tentativas)
+BUCKETS_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registro = {}
+_lock_registro = threading.Lock()
+
+
+def _chave(rotulos):
+    return tuple(sorted(rotulos.items())) if rotulos else ()
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(chave, extra=()):
+    pares = list(chave) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome, self.ajuda = nome, ajuda
+        self.valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, quantidade=1, **rotulos):
+        chave = _chave(rotulos)
+        with self._lock:
+            self.valores[chave] = self.valores.get(chave, 0) + quantidade
+
+    def valor(self, **rotulos):
+        with self._lock:
+            return self.valores.get(_chave(rotulos), 0)
+
+    def _linhas(self):
+        with self._lock:
+            itens = list(self.valores.items())
+        for chave, valor in itens:
+            yield f"{self.nome}{_formatar_rotulos(chave)} {valor}"
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "rotulos", "inicio")
+
+    def __init__(self, histograma, rotulos):
+        self.histograma, self.rotulos = histograma, rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.rotulos)
+        return False
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        self.nome, self.ajuda = nome, ajuda
+        self.buckets = tuple(buckets)
+        self.series = {}  # rótulos -> [contagem por bucket (o último é +Inf), soma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = _chave(rotulos)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self.series.get(chave)
+            if serie is None:
+                serie = self.series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def cronometrar(self, **rotulos):
+        """Context manager que observa a duração do bloco, em segundos."""
+        return _Cronometro(self, rotulos)
+
+    def _linhas(self):
+        with self._lock:
+            itens = [(chave, list(contagens), soma) for chave, (contagens, soma) in self.series.items()]
+        for chave, contagens, soma in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + ("+Inf",), contagens):
+                acumulado += contagem
+                yield f"{self.nome}_bucket{_formatar_rotulos(chave, [('le', limite)])} {acumulado}"
+            yield f"{self.nome}_sum{_formatar_rotulos(chave)} {soma}"
+            yield f"{self.nome}_count{_formatar_rotulos(chave)} {acumulado}"
+
+
+class Medidor:
+    """Valor lido na hora da exportação (ex.: tamanho de fila); não custa nada no caminho quente."""
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao):
+        self.nome, self.ajuda, self.funcao = nome, ajuda, funcao
+
+    def _linhas(self):
+        try:
+            yield f"{self.nome} {float(self.funcao())}"
+        except Exception as e:
+            print(f"Erro ao ler o medidor {self.nome}: {e}")
+
+
+def _registrar(classe, nome, *args):
+    # Idempotente: módulos diferentes podem pedir a mesma métrica pelo nome
+    with _lock_registro:
+        metrica = _registro.get(nome)
+        if metrica is None:
+            metrica = _registro[nome] = classe(nome, *args)
+        return metrica
+
+
+def contador(nome, ajuda):
+    return _registrar(Contador, nome, ajuda)
+
+
+def histograma(nome, ajuda, buckets=BUCKETS_PADRAO):
+    return _registrar(Histograma, nome, ajuda, buckets)
+
+
+def medidor(nome, ajuda, funcao):
+    return _registrar(Medidor, nome, ajuda, funcao)
+
+
+def cronometrado(histograma, **rotulos):
+    """Decorador que observa a duração de cada chamada da função no histograma."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                histograma.observar(time.perf_counter() - inicio, **rotulos)
+        return envoltorio
+    return decorador
+
+
+def exportar():
+    """Todas as métricas registradas, no formato texto do Prometheus (versão 0.0.4)."""
+    with _lock_registro:
+        metricas = list(_registro.values())
+    linhas = []
+    for metrica in metricas:
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(metrica._linhas())
+    return "\n".join(linhas) + "\n"
+
+
+# --- Amostrador de pilhas para seções lentas ---
+
+class AmostradorLento:
+    """
+    Enquanto há seções abertas (ver `secao`), uma thread amostra a pilha de cada uma a cada
+    `intervalo` segundos. Quando a seção termina acima de `limite` segundos, imprime as pilhas
+    mais frequentes (formato "arquivo:função;..." do flamegraph); as demais são descartadas.
+    """
+
+    def __init__(self, limite, intervalo=0.005, max_pilhas=5, profundidade=40):
+        self.limite = limite
+        self.intervalo = intervalo
+        self.max_pilhas = max_pilhas
+        self.profundidade = profundidade
+        self.ativas = {}  # id da thread -> (nome, início, Counter de pilhas)
+        self._lock = threading.Lock()
+        self.lentas = contador("financeiro_secoes_lentas_total", "Seções que passaram do limite do amostrador")
+        threading.Thread(target=self._amostrar, name="amostrador-lento", daemon=True).start()
+
+    def _pilha(self, frame):
+        partes = []
+        while frame is not None and len(partes) < self.profundidade:
+            codigo = frame.f_code
+            partes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(partes))
+
+    def _amostrar(self):
+        while True:
+            time.sleep(self.intervalo)
+            with self._lock:
+                ativas = list(self.ativas.items())
+            if not ativas:
+                continue
+            frames = sys._current_frames()
+            amostras = [(pilhas, self._pilha(frames[thread_id])) for thread_id, (_, _, pilhas) in ativas
+                        if thread_id in frames]
+            # Sob o lock: `secao` lê o Counter quando a seção termina
+            with self._lock:
+                for pilhas, pilha in amostras:
+                    pilhas[pilha] += 1
+
+    @contextmanager
+    def secao(self, nome):
+        thread_id = threading.get_ident()
+        pilhas = Counter()
+        inicio = time.perf_counter()
+        with self._lock:
+            self.ativas[thread_id] = (nome, inicio, pilhas)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.ativas.pop(thread_id, None)
+                pilhas = Counter(pilhas)  # cópia: a thread de amostragem pode ainda ter uma amostra pendente
+            duracao = time.perf_counter() - inicio
+            if duracao >= self.limite:
+                self.lentas.inc(secao=nome)
+                total = sum(pilhas.values()) or 1
+                print(f"Seção lenta '{nome}': {duracao * 1000:.0f} ms, {total} amostras. Pilhas mais frequentes:")
+                for pilha, vezes in pilhas.most_common(self.max_pilhas):
+                    print(f"  {vezes / total:5.0%} {pilha}")
+
+
+# Desligado por padrão; PERFIL_LENTO_MS=500 amostra as seções que passarem de 500 ms
+_PERFIL_LENTO_MS = float(os.getenv("PERFIL_LENTO_MS", "0"))
+amostrador = AmostradorLento(
+    _PERFIL_LENTO_MS / 1000, intervalo=float(os.getenv("PERFIL_INTERVALO_MS", "5")) / 1000
+) if _PERFIL_LENTO_MS > 0 else None
+
+
+def perfilar(nome):
+    """Context manager da seção `nome` no amostrador; não faz nada se ele estiver desligado."""
+    return amostrador.secao(nome) if amostrador is not None else nullcontext()
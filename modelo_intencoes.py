@@ -0,0 +1,94 @@
+"""
+Classificador de intenções compacto: features por hashing (sem vocabulário) e pesos
+esparsos em um .npz. A inferência usa só NumPy; o treino fica em intent_model.py.
+"""
+import zlib
+
+import numpy as np
+
+from texto_utils import palavras
+
+BITS_HASH = 20  # 2**20 posições de hash
+
+
+def tokens(texto):
+    """Palavras, pares de palavras e trigramas de caracteres (com bordas) do texto normalizado."""
+    ps = palavras(texto)
+    saida = [f"p:{p}" for p in ps]
+    saida += [f"b:{a} {b}" for a, b in zip(ps, ps[1:])]
+    for p in ps:
+        marcada = f"<{p}>"
+        saida += [f"c:{marcada[i:i + 3]}" for i in range(len(marcada) - 2)]
+    return saida
+
+
+def indices_hash(texto, bits=BITS_HASH):
+    """Índices (únicos, ordenados) das features do texto; crc32 é estável entre processos e versões."""
+    mascara = (1 << bits) - 1
+    return np.unique(np.fromiter((zlib.crc32(t.encode()) & mascara for t in tokens(texto)), dtype=np.int64))
+
+
+def featurizar(mensagens, bits=BITS_HASH):
+    """
+    Matriz esparsa das mensagens em formato CSR cru: (indptr, indices, valores).
+    Features binárias normalizadas pela norma L2 de cada mensagem.
+    """
+    por_mensagem = [indices_hash(m, bits) for m in mensagens]
+    tamanhos = np.fromiter((len(i) for i in por_mensagem), dtype=np.int64, count=len(por_mensagem))
+    indptr = np.concatenate(([0], np.cumsum(tamanhos)))
+    indices = np.concatenate(por_mensagem) if por_mensagem else np.empty(0, dtype=np.int64)
+    valores = np.repeat(1 / np.sqrt(np.maximum(tamanhos, 1)), tamanhos)
+    return indptr, indices, valores
+
+
+class ModeloIntencoes:
+    """
+    Pesos de um classificador linear um-contra-todos com perda logística, guardados só
+    para as features vistas no treino: `features` (ordenado) e `pesos` (features x classes).
+    """
+
+    def __init__(self, classes, features, pesos, intercepto, bits=BITS_HASH):
+        self.classes_ = np.asarray(classes)
+        self.features = np.asarray(features, dtype=np.int64)
+        self.pesos = np.asarray(pesos, dtype=np.float32)
+        self.intercepto = np.asarray(intercepto, dtype=np.float32)
+        self.bits = int(bits)
+
+    @classmethod
+    def de_coeficientes(cls, classes, coef, intercepto, bits=BITS_HASH):
+        """Monta o modelo a partir do coef_ (classes x 2**bits) do SGDClassifier, descartando colunas nulas."""
+        coef = np.atleast_2d(coef)
+        if len(classes) == 2:
+            # Binário: o sklearn guarda só a classe positiva
+            coef, intercepto = np.vstack([-coef, coef]), np.concatenate([-intercepto, intercepto])
+        features = np.flatnonzero(np.any(coef != 0, axis=0))
+        return cls(classes, features, coef[:, features].T, intercepto, bits)
+
+    def salvar(self, caminho):
+        np.savez_compressed(caminho, classes=self.classes_, features=self.features.astype(np.int32),
+                            pesos=self.pesos, intercepto=self.intercepto, bits=self.bits)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho, allow_pickle=False) as dados:
+            return cls(dados["classes"], dados["features"], dados["pesos"], dados["intercepto"], dados["bits"])
+
+    def pontuar(self, mensagens):
+        """Scores lineares (mensagens x classes) do lote inteiro em uma única multiplicação esparsa."""
+        indptr, indices, valores = featurizar(mensagens, self.bits)
+        posicoes = np.searchsorted(self.features, indices)
+        posicoes[posicoes == len(self.features)] = 0
+        vistas = self.features[posicoes] == indices
+        linhas = np.repeat(np.arange(len(mensagens)), np.diff(indptr))[vistas]
+        contribuicoes = self.pesos[posicoes[vistas]] * valores[vistas, None].astype(np.float32)
+        scores = np.tile(self.intercepto, (len(mensagens), 1))
+        np.add.at(scores, linhas, contribuicoes)
+        return scores
+
+    def predict_proba(self, mensagens):
+        """Probabilidades como no SGDClassifier(loss='log_loss'): sigmoide por classe, normalizada."""
+        proba = 1 / (1 + np.exp(-self.pontuar(mensagens)))
+        return proba / np.maximum(proba.sum(axis=1, keepdims=True), 1e-12)
+
+    def predict(self, mensagens):
+        return self.classes_[self.pontuar(mensagens).argmax(axis=1)]
@@ -0,0 +1,121 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from db import get_db
+from metricas import cronometrado, histograma
+
+DB_SEGUNDOS = histograma("financeiro_db_segundos", "Duração das funções de banco do app")
+
+
+def _mes_anterior(mes):
+    ano, m = map(int, mes.split("-"))
+    return f"{ano - 1}-12" if m == 1 else f"{ano}-{m - 1:02d}"
+
+
+def _proximo_mes(mes):
+    ano, m = map(int, mes.split("-"))
+    return f"{ano + 1}-01" if m == 12 else f"{ano}-{m + 1:02d}"
+
+
+@cronometrado(DB_SEGUNDOS, funcao="definir_orcamento")
+def definir_orcamento(user_id, categoria, limite):
+    """Define (ou substitui) o limite mensal de gastos do usuário para a categoria."""
+    conn = get_db(user_id)
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO orcamentos (user_id, categoria, limite) VALUES (?, ?, ?)",
+            (user_id, categoria.strip().capitalize(), float(limite))
+        )
+
+
+@cronometrado(DB_SEGUNDOS, funcao="gerar_relatorio")
+def gerar_relatorio(user_id, mes=None):
+    """
+    Monta o relatório do mês (AAAA-MM, padrão: mês atual): gastos por categoria,
+    variação em relação ao mês anterior e consumo do orçamento.
+    Busca as transações pagas dos dois meses em uma única consulta e agrega com pandas.
+    """
+    mes = mes or date.today().strftime("%Y-%m")
+    anterior = _mes_anterior(mes)
+
+    conn = get_db(user_id)
+    linhas = conn.execute(
+        """
+        SELECT substr(data, 1, 7), tipo, categoria, valor FROM transacoes
+        WHERE user_id = ? AND status = 'pago' AND data >= ? AND data < ?
+        """,
+        (user_id, f"{anterior}-01", f"{_proximo_mes(mes)}-01")
+    ).fetchall()
+    orcamentos = conn.execute("SELECT categoria, limite FROM orcamentos WHERE user_id = ?", (user_id,)).fetchall()
+
+    df = pd.DataFrame.from_records(linhas, columns=["mes", "tipo", "categoria", "valor"])
+    df["categoria"] = df["categoria"].fillna("Outros").str.strip().str.capitalize()
+    df["valor"] = df["valor"].astype(float)
+
+    totais = df.groupby(["mes", "tipo"])["valor"].sum()
+    gastos = (
+        df[df["tipo"].isin(["despesa", "divida"])]
+        .pivot_table(index="categoria", columns="mes", values="valor", aggfunc="sum", fill_value=0.0)
+        .reindex(columns=[mes, anterior], fill_value=0.0)
+    )
+    limites = pd.Series(dict(orcamentos), dtype=float)
+    gastos = gastos.reindex(gastos.index.union(limites.index), fill_value=0.0)
+
+    atual, previo = gastos[mes].to_numpy(), gastos[anterior].to_numpy()
+    limite = limites.reindex(gastos.index).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variacao = np.where(previo > 0, (atual - previo) / previo * 100, np.nan)
+        consumo = np.where(limite > 0, atual / limite * 100, np.nan)
+
+    categorias = [
+        {
+            "categoria": categoria,
+            "total": float(atual[i]),
+            "mes_anterior": float(previo[i]),
+            "variacao_pct": None if np.isnan(variacao[i]) else float(variacao[i]),
+            "limite": None if np.isnan(limite[i]) else float(limite[i]),
+            "consumo_pct": None if np.isnan(consumo[i]) else float(consumo[i]),
+        }
+        for i, categoria in enumerate(gastos.index)
+        if atual[i] > 0 or not np.isnan(limite[i])
+    ]
+    categorias.sort(key=lambda c: c["total"], reverse=True)
+
+    despesas = float(atual.sum())
+    despesas_anterior = float(previo.sum())
+    return {
+        "mes": mes,
+        "receitas": float(totais.get((mes, "receita"), 0.0)),
+        "despesas": despesas,
+        "despesas_mes_anterior": despesas_anterior,
+        "variacao_despesas_pct": (despesas - despesas_anterior) / despesas_anterior * 100 if despesas_anterior else None,
+        "categorias": categorias,
+    }
+
+
+def formatar_relatorio(relatorio):
+    """Texto do relatório para envio no WhatsApp."""
+    ano, m = relatorio["mes"].split("-")
+    linhas = [
+        f"📊 Resumo de {m}/{ano}",
+        f"Receitas: R${relatorio['receitas']:.2f}",
+        f"Gastos: R${relatorio['despesas']:.2f}",
+    ]
+    if relatorio["variacao_despesas_pct"] is not None:
+        linhas[-1] += f" ({relatorio['variacao_despesas_pct']:+.0f}% vs. mês anterior)"
+    if not relatorio["categorias"]:
+        linhas.append("\nNenhum gasto registrado neste mês.")
+        return "\n".join(linhas)
+
+    linhas.append("\nPor categoria:")
+    for c in relatorio["categorias"]:
+        linha = f"• {c['categoria']}: R${c['total']:.2f}"
+        if c["variacao_pct"] is not None:
+            linha += f" ({c['variacao_pct']:+.0f}%)"
+        if c["consumo_pct"] is not None:
+            alerta = " ⚠️" if c["consumo_pct"] >= 100 else ""
+            linha += f" — {c['consumo_pct']:.0f}% do orçamento de R${c['limite']:.2f}{alerta}"
+        linhas.append(linha)
+    return "\n".join(linhas)
@@ -0,0 +1,26 @@
+import unicodedata
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos, para que buscas e padrões não precisem de variações."""
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    return "".join(c for c in texto if not unicodedata.combining(c)).strip()
+
+
+def palavras(texto):
+    """Palavras alfanuméricas do texto normalizado."""
+    return "".join(c if c.isalnum() else " " for c in normalizar(texto)).split()
+
+
+def trigramas(texto):
+    """Conjunto de trigramas das palavras do texto; palavras menores que 3 letras ("tv") entram inteiras."""
+    return {t for p in palavras(texto) for t in ([p] if len(p) < 3 else (p[i:i + 3] for i in range(len(p) - 2)))}
+
+
+def tokens_busca(user_id, texto):
+    """
+    Tokens indexados na busca de dívidas: cada trigrama prefixado pelo user_id, de modo que
+    a lista de ocorrências de um token no FTS5 contenha só as dívidas daquele usuário.
+    """
+    prefixo = "".join(c for c in str(user_id) if c.isalnum())
+    return " ".join(prefixo + t for t in sorted(trigramas(texto)))
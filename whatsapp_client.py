@@ -0,0 +1,138 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fila import FilaMensagens
+from metricas import histograma
+
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com/v19.0")
+
+# Status que valem nova tentativa: limite de taxa e falhas do lado da Meta
+STATUS_RETENTATIVA = {429, 500, 502, 503, 504}
+
+# Cada POST à Graph API (por status) e a espera no limitador de taxa antes dele
+REQUISICAO_SEGUNDOS = histograma("financeiro_whatsapp_requisicao_segundos", "Duração de cada POST à Graph API, por status")
+ESPERA_LIMITE_SEGUNDOS = histograma("financeiro_whatsapp_espera_limite_segundos", "Espera no limitador de taxa antes de cada envio")
+
+
+class TokenBucket:
+    """Limitador de taxa: libera até `taxa` envios por segundo, com rajadas de até `capacidade`."""
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or taxa)
+        self.tokens = self.capacidade
+        self.atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        """Bloqueia até haver um token disponível."""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado_em) * self.taxa)
+                self.atualizado_em = agora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                espera = (1 - self.tokens) / self.taxa
+            time.sleep(espera)
+
+
+class ClienteWhatsApp:
+    """
+    Cliente de saída da Graph API do WhatsApp: sessão HTTP compartilhada (keep-alive),
+    timeouts explícitos, novas tentativas com backoff exponencial e jitter em 429/5xx,
+    limite de taxa por número e fila de envio com ordem preservada por destinatário.
+    """
+
+    def __init__(self, access_token, phone_number_id, base_url=GRAPH_API_URL, timeout=(3.05, 10),
+                 max_tentativas=4, backoff_base=0.5, backoff_max=8.0, mensagens_por_segundo=80,
+                 num_workers=8, capacidade=10000):
+        self.url = f"{base_url.rstrip('/')}/{phone_number_id}/messages"
+        self.timeout = timeout
+        self.max_tentativas = max_tentativas
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limitador = TokenBucket(mensagens_por_segundo)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=num_workers, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.contadores = {"enviadas": 0, "falhas": 0, "novas_tentativas": 0, "recusadas_fila_cheia": 0}
+        self.fila = FilaMensagens(self.enviar, num_workers=num_workers, capacidade=capacidade)
+
+    def _contar(self, chave):
+        with self._lock:
+            self.contadores[chave] += 1
+
+    def _espera(self, tentativa, response=None):
+        # Respeita o Retry-After da Meta quando vier; senão, backoff exponencial com jitter completo
+        if response is not None and response.headers.get("Retry-After"):
+            try:
+                return min(float(response.headers["Retry-After"]), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** tentativa))
+
+    def enviar(self, phone_number, message_text):
+        """Envia a mensagem imediatamente (no thread atual). Retorna True em caso de sucesso."""
+        data = {"messaging_product": "whatsapp", "to": phone_number, "text": {"body": message_text}}
+        for tentativa in range(self.max_tentativas):
+            with ESPERA_LIMITE_SEGUNDOS.cronometrar():
+                self.limitador.adquirir()
+            response = None
+            inicio = time.perf_counter()
+            try:
+                response = self.session.post(self.url, json=data, timeout=self.timeout)
+                REQUISICAO_SEGUNDOS.observar(time.perf_counter() - inicio, status=response.status_code)
+                if response.status_code not in STATUS_RETENTATIVA:
+                    response.raise_for_status()
+                    self._contar("enviadas")
+                    print(f"Mensagem enviada para {phone_number}: {message_text}")
+                    return True
+                erro = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                REQUISICAO_SEGUNDOS.observar(time.perf_counter() - inicio, status="erro_rede")
+                erro = str(e)
+            except requests.RequestException as e:
+                # 4xx que não seja 429: tentar de novo não resolve
+                print(f"Erro ao enviar mensagem para {phone_number}: {e}")
+                break
+
+            if tentativa + 1 < self.max_tentativas:
+                self._contar("novas_tentativas")
+                espera = self._espera(tentativa, response)
+                print(f"Falha ao enviar para {phone_number} ({erro}); nova tentativa em {espera:.2f}s")
+                time.sleep(espera)
+            else:
+                print(f"Erro ao enviar mensagem para {phone_number} após {self.max_tentativas} tentativas: {erro}")
+
+        self._contar("falhas")
+        return False
+
+    def enfileirar(self, phone_number, message_text, timeout=5):
+        """Coloca a mensagem na fila de envio. Retorna False se a fila continuar cheia após `timeout`."""
+        if self.fila.enfileirar(phone_number, message_text, timeout=timeout):
+            return True
+        self._contar("recusadas_fila_cheia")
+        return False
+
+    def obter_estatisticas(self):
+        with self._lock:
+            estatisticas = dict(self.contadores)
+        estatisticas["fila_pendente"] = self.fila.tamanho()
+        return estatisticas
+
+    def encerrar(self, timeout=30):
+        """Aguarda o envio do que já está na fila e fecha a sessão HTTP."""
+        self.fila.encerrar(timeout)
+        self.session.close()